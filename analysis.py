@@ -0,0 +1,244 @@
+from board import Board
+from evaluation import WIN_THRESHOLD
+from minimax import MiniMax, TranspositionTable
+from records import GameRecord, read_games
+from utils import Mark
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from typing import Dict, List, Optional
+import argparse
+import json
+import os
+import time
+
+
+class MoveAnalysis:
+	"""
+	Result of the search of one position of a recorded game. Values are from the
+	perspective of the player on move, the value of the played move is the negated
+	value of the next position (None for the last move of the game).
+	"""
+	def __init__(self, game: int, ply: int, mark: Mark, move: int, best: Optional[int], value: float, depth: int) -> None:
+		self.game = game
+		self.ply = ply
+		self.mark = mark
+		# Tile indexes (x*size + y) of the played move and of the best move of the search
+		self.move = move
+		self.best = best
+		self.value = value
+		self.depth = depth
+		self.played_value: Optional[float] = None
+		# False when the played move leads to the same position as the best move up to symmetry
+		self.disagrees = False
+
+	def get_loss(self) -> float:
+		"""
+		:return: How much worse the played move is than the best move, 0 when it is not known
+		"""
+		if self.played_value is None:
+			return 0.0
+		return max(0.0, self.value - self.played_value)
+
+	def is_blunder(self) -> bool:
+		"""
+		:return: True if the played move lost won position or lost position that was not lost
+		"""
+		if self.played_value is None:
+			return False
+		return (self.value >= WIN_THRESHOLD > self.played_value) or (self.value > -WIN_THRESHOLD >= self.played_value)
+
+	def to_json(self, size: int) -> str:
+		return json.dumps({
+			'game': self.game, 'ply': self.ply, 'mark': self.mark.name,
+			'move': [self.move // size, self.move % size],
+			'best': None if self.best is None else [self.best // size, self.best % size],
+			'value': self.value, 'played_value': self.played_value, 'depth': self.depth,
+			'loss': self.get_loss(), 'disagrees': self.disagrees, 'blunder': self.is_blunder(),
+		})
+
+
+# Transposition table of worker process, it is allocated once and cleared for every game
+_analysis_table = None
+
+
+def _init_analysis_worker(table_size_mb: int) -> None:
+	"""
+	Initializes worker process of the analysis.
+	:param table_size_mb: Memory cap of worker's transposition table
+	"""
+	global _analysis_table
+	_analysis_table = TranspositionTable(table_size_mb)
+
+
+def analyze_game(index: int, record: GameRecord, max_depth: Optional[int], time_limit_ms: Optional[int],
+				 candidate_radius: Optional[int] = None, table: Optional[TranspositionTable] = None) -> List[MoveAnalysis]:
+	"""
+	Replays the game and searches every position before a move. The table is cleared
+	first, so results of the game do not depend on games searched before by the process
+	(on the number of workers or on where the analysis was resumed).
+	:param index: Number of the game in the file
+	:param record: GameRecord of the game
+	:param max_depth: Depth of the search, with time limit only the deepest iteration
+	:param time_limit_ms: Time limit of the search of every position, None for fixed depth
+	:param candidate_radius: Radius of searched tiles around marks, None for the default
+	:param table: Transposition table, table of the worker process when None
+	:return: List of MoveAnalysis of all moves
+	"""
+	if table is None:
+		table = _analysis_table if _analysis_table is not None else TranspositionTable()
+	table.clear()
+	board = Board(record.board_size, record.end_count)
+	results = []
+	for ply, position in enumerate(record.get_moves()):
+		mark = Mark.X if ply % 2 == 0 else Mark.O
+		mm = MiniMax(board, mark, max_depth, table, time_limit_ms, candidate_radius=candidate_radius)
+		mm.compute()
+		best = mm.get_best_move()
+		value = max((move.value for move in mm.moves), default=0.0)
+		analysis = MoveAnalysis(index, ply, mark, position.x*board.size + position.y,
+								None if best is None else best.x*board.size + best.y, value, mm.completed_depth)
+		if best is not None and best != position:
+			board.set_move(best, mark)
+			best_key = board.get_canonical_key()[0]
+			board.undo_move()
+			board.set_move(position, mark)
+			analysis.disagrees = board.get_canonical_key()[0] != best_key
+		else:
+			board.set_move(position, mark)
+		if len(results) > 0:
+			results[-1].played_value = -value
+		results.append(analysis)
+
+	# The last move is judged by the result of the game
+	if len(results) > 0 and record.get_winner() is not None:
+		results[-1].played_value = results[-1].value
+	return results
+
+
+class Checkpoint:
+	"""
+	Progress of the analysis stored next to the output file - number of analysed games
+	and size of the output after them. Output written after the last checkpoint is
+	cut off when the analysis is resumed.
+	"""
+	def __init__(self, path: str) -> None:
+		self.path = path
+		self.games = 0
+		self.offset = 0
+		if os.path.exists(path):
+			with open(path) as f:
+				data = json.load(f)
+			self.games = data['games']
+			self.offset = data['offset']
+
+	def save(self, games: int, offset: int) -> None:
+		"""
+		Stores the progress. The file is replaced at once so it is never half written.
+		:param games: Number of analysed games
+		:param offset: Size of the output file
+		"""
+		self.games = games
+		self.offset = offset
+		temp = self.path + '.tmp'
+		with open(temp, 'w') as f:
+			json.dump({'games': games, 'offset': offset}, f)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(temp, self.path)
+
+
+def run_analysis(input_path: str, output_path: str, max_depth: Optional[int] = 2, time_limit_ms: Optional[int] = None,
+				 candidate_radius: Optional[int] = None, workers: int = 1, table_size_mb: int = 64,
+				 checkpoint_interval: float = 10.0, max_games: Optional[int] = None) -> Dict[str, int]:
+	"""
+	Analyses games from the file and writes one JSON line for every move to the output. Games are
+	searched by `workers` processes and written in the order of the input. Progress is saved to
+	`output_path`.checkpoint every `checkpoint_interval` seconds and the analysis continues from
+	it when it is started again.
+	:param input_path: File with game records
+	:param output_path: File with results
+	:param max_depth: Depth of the search of every position
+	:param time_limit_ms: Time limit of the search of every position
+	:param candidate_radius: Radius of searched tiles around marks
+	:param workers: Number of processes
+	:param table_size_mb: Memory cap of transposition table of every process
+	:param checkpoint_interval: Seconds between checkpoints
+	:param max_games: Number of games analysed by this run, None for all remaining games
+	:return: Dictionary with number of games, moves, disagreements and blunders analysed by this run
+	"""
+	checkpoint = Checkpoint(output_path + '.checkpoint')
+	if not os.path.exists(output_path):
+		checkpoint.games = 0
+		checkpoint.offset = 0
+	output = open(output_path, 'r+b' if os.path.exists(output_path) else 'wb')
+	output.truncate(checkpoint.offset)
+	output.seek(checkpoint.offset)
+	summary = {'games': 0, 'moves': 0, 'disagreements': 0, 'blunders': 0}
+	games = checkpoint.games
+	last_checkpoint = time.monotonic()
+
+	def write_game(record: GameRecord, results: List[MoveAnalysis]) -> None:
+		nonlocal games, last_checkpoint
+		for analysis in results:
+			output.write(analysis.to_json(record.board_size).encode() + b'\n')
+			summary['disagreements'] += analysis.disagrees
+			summary['blunders'] += analysis.is_blunder()
+		summary['games'] += 1
+		summary['moves'] += len(results)
+		games += 1
+		if time.monotonic() - last_checkpoint >= checkpoint_interval:
+			output.flush()
+			checkpoint.save(games, output.tell())
+			last_checkpoint = time.monotonic()
+
+	def get_records():
+		first = games
+		for index, record in enumerate(read_games(input_path)):
+			if index < first:
+				continue
+			if max_games is not None and index >= first + max_games:
+				break
+			yield index, record
+
+	try:
+		if workers > 1:
+			with ProcessPoolExecutor(workers, initializer=_init_analysis_worker, initargs=(table_size_mb,)) as executor:
+				# Only few games are submitted ahead so huge files are not read into memory
+				pending = deque()
+				for index, record in get_records():
+					pending.append((record, executor.submit(analyze_game, index, record, max_depth, time_limit_ms, candidate_radius)))
+					if len(pending) >= 4*workers:
+						record, future = pending.popleft()
+						write_game(record, future.result())
+				while pending:
+					record, future = pending.popleft()
+					write_game(record, future.result())
+		else:
+			table = TranspositionTable(table_size_mb)
+			for index, record in get_records():
+				write_game(record, analyze_game(index, record, max_depth, time_limit_ms, candidate_radius, table))
+	finally:
+		output.flush()
+		checkpoint.save(games, output.tell())
+		output.close()
+	return summary
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Searches every position of recorded games and finds moves that differ from the search.')
+	parser.add_argument('input', help='File with game records')
+	parser.add_argument('output', help='File with one JSON line for every move, analysis continues from its checkpoint')
+	parser.add_argument('--depth', type=int, default=2, help='Depth of the search of every position')
+	parser.add_argument('--time-limit-ms', type=int, help='Time limit of the search of every position')
+	parser.add_argument('--candidate-radius', type=int)
+	parser.add_argument('--workers', type=int, default=1)
+	parser.add_argument('--checkpoint-interval', type=float, default=10.0, help='Seconds between checkpoints')
+	parser.add_argument('--games', type=int, help='Number of games analysed by this run')
+	args = parser.parse_args()
+
+	start = time.perf_counter()
+	summary = run_analysis(args.input, args.output, args.depth, args.time_limit_ms, args.candidate_radius, args.workers,
+						   checkpoint_interval=args.checkpoint_interval, max_games=args.games)
+	elapsed = time.perf_counter() - start
+	print(f'{summary["games"]} games, {summary["moves"]} moves analysed in {elapsed:.1f} s ({summary["moves"]/elapsed:.1f} positions per second)')
+	print(f'Disagreements with the search: {summary["disagreements"]}, blunders: {summary["blunders"]}')
@@ -0,0 +1,253 @@
+from utils import Point, Mark
+from typing import Dict, List, Optional
+import argparse
+import time
+
+# NumPy is needed only for batched games, the game itself has no dependencies
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+
+POLICIES = ['random', 'pattern']
+
+
+class BatchGames:
+	"""
+	Plays many games at once. Boards of all games are one NumPy array (games x size x size)
+	with 1 for X, -1 for O and 0 for empty tile, so every step places one mark on every
+	board and checks wins of all boards with a few array operations instead of Python
+	code per game. All games start on empty board and X moves first, so all unfinished
+	games have the same player on move. Finished games are not changed by next steps.
+	"""
+	def __init__(self, count: int, size: int, end_count: int, seed: Optional[int] = None) -> None:
+		if np is None:
+			raise ImportError('BatchGames needs NumPy')
+		self.count = count
+		self.size = size
+		self.end_count = end_count
+		self.rng = np.random.default_rng(seed)
+		# Slices of the board with k-th tile of every window of end_count tiles in each direction
+		self.window_slices = [self.get_window_slices(dx, dy) for dx, dy in [[1,0], [1,1], [0,1], [1,-1]]]
+		self.reset()
+
+	def reset(self) -> None:
+		"""
+		Clears all boards.
+		"""
+		cells = self.size * self.size
+		self.boards = np.zeros((self.count, self.size, self.size), dtype=np.int8)
+		# Tile indexes (x*size + y) of moves of every game, -1 after the end of the game
+		self.moves = np.full((self.count, cells), -1, dtype=np.int16)
+		# 1 for win of X, -1 for win of O, 0 for draw or unfinished game
+		self.winners = np.zeros(self.count, dtype=np.int8)
+		self.finished = np.zeros(self.count, dtype=bool)
+		self.lengths = np.zeros(self.count, dtype=np.int32)
+		self.ply = 0
+
+	def get_mark(self) -> int:
+		"""
+		:return: 1 if X is on move, -1 if O is on move
+		"""
+		return 1 if self.ply % 2 == 0 else -1
+
+	def step(self, moves: 'np.ndarray') -> None:
+		"""
+		Places mark of the player on move on every unfinished board and checks the end of the games.
+		:param moves: Array with tile index (x*size + y) of empty tile for every game, ignored for finished games
+		"""
+		mark = self.get_mark()
+		active = np.flatnonzero(~self.finished)
+		tiles = moves[active]
+		xs = tiles // self.size
+		ys = tiles % self.size
+		self.boards[active, xs, ys] = mark
+		self.moves[active, self.ply] = tiles
+		self.lengths[active] += 1
+		self.ply += 1
+
+		won = self.check_moves(active, xs, ys, mark)
+		self.winners[active[won]] = mark
+		self.finished[active[won]] = True
+		if self.ply == self.size * self.size:
+			self.finished[:] = True
+
+	def check_moves(self, games: 'np.ndarray', xs: 'np.ndarray', ys: 'np.ndarray', mark: int) -> 'np.ndarray':
+		"""
+		Checks if marks on given positions are part of `end_count` marks in a row.
+		Only tiles less than `end_count` steps from the move in the four directions are read.
+		:param games: Indexes of the games
+		:param xs: x positions of the moves
+		:param ys: y positions of the moves
+		:param mark: Mark of the moves
+		:return: Bool array, True for games won by the move
+		"""
+		n = self.end_count
+		offsets = np.arange(-n + 1, n)
+		won = np.zeros(len(games), dtype=bool)
+		for dx, dy in [[1,0], [1,1], [0,1], [1,-1]]:
+			px = xs[:, None] + offsets*dx
+			py = ys[:, None] + offsets*dy
+			inside = (px >= 0) & (px < self.size) & (py >= 0) & (py < self.size)
+			line = self.boards[games[:, None], np.clip(px, 0, self.size - 1), np.clip(py, 0, self.size - 1)]
+			line = ((line == mark) & inside).astype(np.int8)
+			sums = np.cumsum(line, axis=1)
+			windows = sums[:, n - 1:].copy()
+			windows[:, 1:] -= sums[:, :-n]
+			won |= (windows == n).any(axis=1)
+		return won
+
+	def get_window_slices(self, dx: int, dy: int) -> List[tuple]:
+		"""
+		Computes slices of the board for windows of `end_count` tiles in the direction.
+		The k-th slice has k-th tiles of all windows that fit into the board.
+		:param dx: Step in x
+		:param dy: Step in y
+		:return: List of `end_count` index tuples for boards array
+		"""
+		n = self.end_count
+		count_x = self.size - (n - 1)*abs(dx)
+		count_y = self.size - (n - 1)*abs(dy)
+		start_y = n - 1 if dy < 0 else 0
+		slices = []
+		for k in range(n):
+			x = k*dx
+			y = start_y + k*dy
+			slices.append((slice(None), slice(x, x + count_x), slice(y, y + count_y)))
+		return slices
+
+	def random_moves(self) -> 'np.ndarray':
+		"""
+		:return: Random empty tile of every board
+		"""
+		scores = self.rng.random((self.count, self.size * self.size))
+		scores[self.boards.reshape(self.count, -1) != 0] = -1
+		return scores.argmax(axis=1)
+
+	def pattern_moves(self) -> 'np.ndarray':
+		"""
+		Scores empty tiles by windows of `end_count` tiles through them like Evaluator
+		- every window without marks of the other player adds weight growing with number
+		of player's marks in it. Completing own line has the highest weight and blocking
+		opponent's line the second. Ties are broken randomly.
+		:return: Tile with the best score of every board
+		"""
+		n = self.end_count
+		mark = self.get_mark()
+		own = (self.boards == mark).astype(np.int8)
+		other = (self.boards == -mark).astype(np.int8)
+		weights = 4.0 ** np.arange(n + 1)
+		weights[n - 1] = 4.0 ** (2*n + 1)
+		# Opponent's lines are blocked before own lines of the same length are extended, except winning ones
+		block_weights = 2.0 * weights
+		block_weights[n - 1] = 4.0 ** (2*n)
+
+		scores = np.zeros(self.boards.shape)
+		for slices in self.window_slices:
+			own_count = sum(own[s] for s in slices)
+			other_count = sum(other[s] for s in slices)
+			value = np.where(other_count == 0, weights[own_count], 0) + np.where(own_count == 0, block_weights[other_count], 0)
+			for s in slices:
+				scores[s] += value
+		scores = scores.reshape(self.count, -1) + self.rng.random((self.count, self.size * self.size))
+		scores[self.boards.reshape(self.count, -1) != 0] = -1
+		return scores.argmax(axis=1)
+
+	def play(self, policy_x: str = 'random', policy_o: str = 'random') -> None:
+		"""
+		Plays all games to the end.
+		:param policy_x: Policy of X from POLICIES
+		:param policy_o: Policy of O from POLICIES
+		"""
+		while not self.finished.all():
+			policy = policy_x if self.get_mark() == 1 else policy_o
+			if policy == 'pattern':
+				moves = self.pattern_moves()
+			else:
+				moves = self.random_moves()
+			self.step(moves)
+
+	def get_game(self, index: int) -> List[Point]:
+		"""
+		:param index: Index of the game
+		:return: List of Points with moves of the game, X moves first
+		"""
+		return [Point(int(tile) // self.size, int(tile) % self.size) for tile in self.moves[index, :self.lengths[index]]]
+
+	def get_winner(self, index: int) -> Optional[Mark]:
+		"""
+		:param index: Index of the game
+		:return: Mark of the winner or None for draw or unfinished game
+		"""
+		if self.winners[index] == 0:
+			return None
+		return Mark.X if self.winners[index] == 1 else Mark.O
+
+	def get_statistics(self) -> Dict[str, float]:
+		"""
+		:return: Dictionary with number of games won by X, by O, drawn, average game length and number of positions
+		"""
+		return {
+			'x_wins': int((self.winners == 1).sum()),
+			'o_wins': int((self.winners == -1).sum()),
+			'draws': int((self.finished & (self.winners == 0)).sum()),
+			'average_length': float(self.lengths.mean()),
+			'positions': int(self.lengths.sum()),
+		}
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Plays batches of games with simple policies using NumPy.')
+	parser.add_argument('--games', type=int, default=10000)
+	parser.add_argument('--batch', type=int, default=10000, help='Number of games played at once')
+	parser.add_argument('--board-size', type=int, default=15)
+	parser.add_argument('--end-count', type=int, default=5)
+	parser.add_argument('--policy-x', choices=POLICIES, default='random')
+	parser.add_argument('--policy-o', choices=POLICIES, default='random')
+	parser.add_argument('--seed', type=int)
+	parser.add_argument('--book', help='Path of opening book built from moves of winners')
+	parser.add_argument('--book-plies', type=int, default=4, help='Number of moves from the beginning of the games in the book')
+	parser.add_argument('--record', help='Path to file where games are appended (see records.py)')
+	args = parser.parse_args()
+
+	builder = None
+	if args.book is not None:
+		from book import BookBuilder
+		builder = BookBuilder(args.board_size, args.end_count)
+	writer = None
+	if args.record is not None:
+		from records import GameRecord, GameRecordWriter
+		writer = GameRecordWriter(args.record)
+
+	totals = {}
+	start = time.monotonic()
+	games = BatchGames(min(args.batch, args.games), args.board_size, args.end_count, args.seed)
+	played = 0
+	while played < args.games:
+		if args.games - played < games.count:
+			games = BatchGames(args.games - played, args.board_size, args.end_count, games.rng.integers(2**32))
+		games.reset()
+		games.play(args.policy_x, args.policy_o)
+		for key, value in games.get_statistics().items():
+			totals[key] = totals.get(key, 0) + value * (games.count if key == 'average_length' else 1)
+		if builder is not None:
+			for i in range(games.count):
+				builder.add_game(games.get_game(i), games.get_winner(i), args.book_plies)
+		if writer is not None:
+			for i in range(games.count):
+				writer.write(GameRecord.from_moves(args.board_size, args.end_count, args.policy_x, args.policy_o,
+												   games.get_game(i), games.get_winner(i)))
+		played += games.count
+	elapsed = time.monotonic() - start
+
+	print(f'{played} games of {args.policy_x} X vs {args.policy_o} O on {args.board_size}x{args.board_size}, {args.end_count} in a row')
+	print(f'X wins: {totals["x_wins"]} ({100*totals["x_wins"]/played:.1f}%), O wins: {totals["o_wins"]} ({100*totals["o_wins"]/played:.1f}%), draws: {totals["draws"]} ({100*totals["draws"]/played:.1f}%)')
+	print(f'Average game length: {totals["average_length"]/played:.1f} moves')
+	print(f'{totals["positions"]/elapsed:.0f} positions per second, {played/elapsed:.1f} games per second')
+	if writer is not None:
+		writer.close()
+		print(f'{writer.count} games appended to {args.record}')
+	if builder is not None:
+		builder.write(args.book)
+		print(f'{len(builder.entries)} entries written to {args.book}')
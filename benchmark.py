@@ -0,0 +1,212 @@
+from board import Board
+from bitboard import BitBoard
+from evaluation import Evaluator, WIN_THRESHOLD
+from minimax import MiniMax, TranspositionTable
+from utils import Point, Mark
+from typing import Callable, Dict, List, Optional
+import argparse
+import json
+import platform
+import sys
+import timeit
+
+
+# Fixed positions for search benchmark. Moves alternate starting with X,
+# the search is made for the player on move to given depth. Positions are quiet -
+# neither player has forced win within the depth or by threat search, so every
+# search reaches its depth (positions with end_count 3 are always decided).
+POSITIONS = [
+	{'name': '6x6-4-a', 'board_size': 6, 'end_count': 4, 'depth': 4,
+	 'moves': [(3,3), (2,4), (3,5), (3,2), (2,3), (1,3)]},
+	{'name': '6x6-4-b', 'board_size': 6, 'end_count': 4, 'depth': 4,
+	 'moves': [(3,3), (4,3), (5,3), (4,2), (4,4), (2,2), (3,1), (3,4), (3,2), (3,0)]},
+	{'name': '7x7-4-a', 'board_size': 7, 'end_count': 4, 'depth': 4,
+	 'moves': [(3,3), (2,3), (1,4), (3,4), (1,5), (1,2), (0,1), (4,2)]},
+	{'name': '8x8-4-a', 'board_size': 8, 'end_count': 4, 'depth': 3,
+	 'moves': [(4,4), (4,3), (4,2), (5,4), (3,3), (2,2), (5,1), (2,4), (6,5)]},
+	{'name': '8x8-5-a', 'board_size': 8, 'end_count': 5, 'depth': 3,
+	 'moves': [(4,4), (3,3), (5,4), (3,4), (2,3), (3,2), (3,1), (4,2), (3,5), (2,2), (5,2), (2,6)]},
+	{'name': '10x10-4-a', 'board_size': 10, 'end_count': 4, 'depth': 3,
+	 'moves': [(5,5), (6,5), (5,6), (5,4), (5,7), (5,8), (4,3), (6,8)]},
+	{'name': '10x10-5-a', 'board_size': 10, 'end_count': 5, 'depth': 3,
+	 'moves': [(5,5), (6,6), (4,4), (7,7), (5,3), (5,6), (6,2), (7,1), (7,6), (6,7), (5,2), (6,5), (6,8), (7,8)]},
+	{'name': '12x12-5-a', 'board_size': 12, 'end_count': 5, 'depth': 3,
+	 'moves': [(6,6), (5,7), (4,7), (5,6), (7,7), (8,8), (7,8), (5,5), (5,4), (4,5), (7,9), (7,6)]},
+	{'name': '15x15-5-a', 'board_size': 15, 'end_count': 5, 'depth': 3,
+	 'moves': [(7,7), (8,6), (9,6), (9,5), (8,7), (9,7), (10,5), (7,8), (10,6)]},
+	{'name': '15x15-5-b', 'board_size': 15, 'end_count': 5, 'depth': 3,
+	 'moves': [(7,7), (8,6), (6,8), (5,9), (8,8), (6,9), (7,8), (7,9), (8,9), (9,8), (4,9), (4,8), (9,9), (10,10),
+			   (9,10), (10,11), (6,6), (5,5)]},
+	{'name': '19x19-5-a', 'board_size': 19, 'end_count': 5, 'depth': 3,
+	 'moves': [(9,9), (8,10), (9,10), (9,11), (7,9), (8,9), (8,8), (8,12), (8,13), (7,13), (10,10)]},
+	{'name': '19x19-5-b', 'board_size': 19, 'end_count': 5, 'depth': 3,
+	 'moves': [(9,9), (10,8), (8,9), (10,9), (10,7), (9,8), (8,8), (8,7), (7,6), (11,10), (11,11), (12,12), (12,11),
+			   (11,8), (10,10), (13,11), (12,10), (7,7), (10,12), (9,13), (12,8), (14,10)]},
+]
+
+
+def create_board(position: dict, board_class: type = Board) -> Board:
+	"""
+	Creates board with moves of the position.
+	:param position: Position from POSITIONS
+	:param board_class: Board or BitBoard
+	:return: Board with the position
+	"""
+	board = board_class(position['board_size'], position['end_count'])
+	for i, (x, y) in enumerate(position['moves']):
+		board.set_move(Point(x, y), Mark.X if i % 2 == 0 else Mark.O)
+	return board
+
+
+def benchmark_search(position: dict) -> dict:
+	"""
+	Searches the position with iterative deepening to its depth. Position whose value is
+	a win or a loss is flagged as decided - its search ends early and says nothing about speed.
+	:param position: Position from POSITIONS
+	:return: Dictionary with nodes, time, nodes per second, time to each depth, best move and the flag
+	"""
+	board = create_board(position)
+	mark = Mark.X if len(position['moves']) % 2 == 0 else Mark.O
+	mm = MiniMax(board, mark, position['depth'], TranspositionTable(16), time_limit_ms=10**9)
+	stats = mm.compute()
+	best_move = mm.get_best_move()
+	best_value = max(move.value for move in mm.moves if move.position == best_move)
+	return {
+		'name': position['name'],
+		'nodes': stats.nodes,
+		'time': stats.time,
+		'nodes_per_second': stats.get_nodes_per_second(),
+		'depth': stats.depth,
+		'time_to_depth': stats.depth_times,
+		'branching_factor': stats.get_branching_factor(),
+		'best_move': [best_move.x, best_move.y],
+		'best_value': best_value,
+		'decided': abs(best_value) >= WIN_THRESHOLD or stats.depth < position['depth'],
+	}
+
+
+def measure(function: Callable, repeat: int) -> float:
+	"""
+	Measures calls of the function.
+	:param function: Function without parameters
+	:param repeat: Number of calls in one measurement
+	:return: Calls per second from the fastest of three measurements
+	"""
+	best = min(timeit.repeat(function, number=repeat, repeat=3))
+	return repeat / best
+
+
+def benchmark_board(board_class: type, position: dict, repeat: int) -> Dict[str, float]:
+	"""
+	Measures board primitives on the position.
+	:param board_class: Board or BitBoard
+	:param position: Position from POSITIONS
+	:param repeat: Number of calls in one measurement
+	:return: Dictionary with calls per second of each primitive
+	"""
+	board = create_board(position, board_class)
+	move = board.get_candidate_tiles()[0]
+	mark = Mark.X if len(position['moves']) % 2 == 0 else Mark.O
+	evaluator = Evaluator(board)
+
+	def set_and_undo():
+		board.set_move(move, mark)
+		board.undo_move()
+
+	return {
+		'check_end': measure(board.check_end, repeat),
+		'copy': measure(board.copy, repeat),
+		'get_candidate_tiles': measure(board.get_candidate_tiles, repeat),
+		'get_empty_tiles': measure(board.get_empty_tiles, repeat),
+		'set_and_undo_move': measure(set_and_undo, repeat),
+		'evaluate_move': measure(lambda: evaluator.get_move_delta(board, board.last_move), repeat),
+	}
+
+
+def run_benchmarks(names: Optional[List[str]] = None, repeat: int = 2000) -> dict:
+	"""
+	Runs search benchmark on all positions and micro benchmarks of boards.
+	:param names: Names of positions to search, None for all positions
+	:param repeat: Number of calls in one measurement of board primitives
+	:return: Dictionary with all results that can be stored as JSON
+	"""
+	results = {
+		'python': platform.python_version(),
+		'machine': platform.machine(),
+		'search': [],
+		'board': {},
+	}
+	for position in POSITIONS:
+		if names is None or position['name'] in names:
+			results['search'].append(benchmark_search(position))
+
+	# Micro benchmarks on the largest board with most marks
+	position = POSITIONS[-1]
+	for board_class in [Board, BitBoard]:
+		results['board'][board_class.__name__] = benchmark_board(board_class, position, repeat)
+	return results
+
+
+def compare(results: dict, baseline: dict) -> List[str]:
+	"""
+	Compares results with older results.
+	:param results: Results of run_benchmarks()
+	:param baseline: Older results of run_benchmarks()
+	:return: List of positions where the best move or its value changed
+	"""
+	old = {search['name']: search for search in baseline['search']}
+	changed = []
+	for search in results['search']:
+		name = search['name']
+		if name not in old:
+			continue
+		speedup = old[name]['time'] / search['time'] if search['time'] > 0 else 0.0
+		print(f'{name:12} nodes {old[name]["nodes"]:>9} -> {search["nodes"]:>9}  time x{speedup:.2f} faster')
+		if search['best_move'] != old[name]['best_move'] or search['best_value'] != old[name]['best_value']:
+			changed.append(name)
+			print(f'{name:12} best move changed {old[name]["best_move"]} ({old[name]["best_value"]}) -> {search["best_move"]} ({search["best_value"]})')
+	return changed
+
+
+def print_results(results: dict) -> None:
+	"""
+	Prints results in human readable table.
+	:param results: Results of run_benchmarks()
+	"""
+	print(f'{"position":12} {"depth":>5} {"nodes":>9} {"time [s]":>9} {"nodes/s":>9}  best move')
+	for search in results['search']:
+		print(f'{search["name"]:12} {search["depth"]:>5} {search["nodes"]:>9} {search["time"]:>9.3f} {search["nodes_per_second"]:>9.0f}  '
+			  f'{search["best_move"]} ({search["best_value"]}){"  DECIDED" if search["decided"] else ""}')
+	print()
+	for board_class, primitives in results['board'].items():
+		print(board_class)
+		for name, calls in primitives.items():
+			print(f'  {name:20} {calls:>12.0f} calls/s')
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Benchmarks search and board primitives on fixed positions.')
+	parser.add_argument('--positions', nargs='*', help='Names of positions to search, all by default')
+	parser.add_argument('--repeat', type=int, default=2000, help='Number of calls in one measurement of board primitives')
+	parser.add_argument('--output', help='Store results as JSON to this file')
+	parser.add_argument('--compare', help='Compare with results stored in this JSON file')
+	args = parser.parse_args()
+
+	results = run_benchmarks(args.positions, args.repeat)
+	print_results(results)
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump(results, f, indent=2)
+	# Decided positions end their search early, so they do not measure search speed
+	decided = [search['name'] for search in results['search'] if search['decided']]
+	if len(decided) > 0:
+		print(f'\nPositions are decided, replace them by quiet positions: {", ".join(decided)}', file=sys.stderr)
+
+	changed = []
+	if args.compare:
+		with open(args.compare) as f:
+			baseline = json.load(f)
+		print()
+		changed = compare(results, baseline)
+	if len(decided) > 0 or len(changed) > 0:
+		sys.exit(1)
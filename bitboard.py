@@ -0,0 +1,258 @@
+from board import Board
+from utils import Point
+from typing import Dict, List, Optional, Tuple
+
+
+class BitBoardMasks:
+	"""
+	Precomputed bit masks shared by all BitBoards of the same size and end_count.
+	Tile [x,y] is stored in bit x*stride + y where stride is size + 1. The extra
+	column is always empty so shifting a mask never wraps to the next row.
+	"""
+	def __init__(self, size: int, end_count: int) -> None:
+		self.size = size
+		self.end_count = end_count
+		self.stride = size + 1
+		# Bit shift for one step in each of the four line directions
+		self.directions = [[1,0], [1,1], [0,1], [1,-1]]
+		self.shifts = [dx*self.stride + dy for dx, dy in self.directions]
+
+		self.board_mask = 0
+		self.points: List[Optional[Point]] = [None] * (size * self.stride)
+		# Single bit masks of tiles indexed by Board index x*size + y
+		self.bits: List[int] = [0] * (size * size)
+		for x in range(size):
+			for y in range(size):
+				index = x*self.stride + y
+				self.board_mask |= 1 << index
+				self.points[index] = Point(x, y)
+				self.bits[x*size + y] = 1 << index
+
+		# line_masks[d][index] has all tiles that are less than end_count steps
+		# away from the index in direction d. Every winning line through the tile
+		# in direction d fits into this mask.
+		self.line_masks: List[List[int]] = []
+		for dx, dy in self.directions:
+			masks = [0] * (size * self.stride)
+			for x in range(size):
+				for y in range(size):
+					mask = 0
+					for i in range(-end_count+1, end_count):
+						lx = x + i*dx
+						ly = y + i*dy
+						if 0 <= lx < size and 0 <= ly < size:
+							mask |= 1 << (lx*self.stride + ly)
+					masks[x*self.stride + y] = mask
+			self.line_masks.append(masks)
+
+	def __reduce__(self):
+		# Masks are rebuilt from cache in other processes instead of pickling all of them
+		return (get_masks, (self.size, self.end_count))
+
+
+_masks_cache: Dict[Tuple[int, int], BitBoardMasks] = {}
+
+
+def get_masks(size: int, end_count: int) -> BitBoardMasks:
+	"""
+	Returns precomputed masks for given board configuration. Masks are computed
+	only once for each configuration.
+	:param size: Size of the board
+	:param end_count: Number of marks in a row necessary for winning
+	:return: BitBoardMasks for the configuration
+	"""
+	key = (size, end_count)
+	if key not in _masks_cache:
+		_masks_cache[key] = BitBoardMasks(size, end_count)
+	return _masks_cache[key]
+
+
+class BitBoard(Board):
+	"""
+	Game board that stores marks of each player in one integer bitmask.
+	Drop-in replacement of Board - win detection is done with shifts and ANDs
+	of whole lines. In CPython it is slower than Board with its precomputed line
+	tables (on 19x19 check_end 193k/s vs 801k/s, set and undo 90k/s vs 124k/s,
+	get_empty_tiles 11k/s vs 35k/s, search to depth 3 10-40% slower), only copy is
+	faster. Board is used by default, the masks are used by MCTS.
+	"""
+	def init_tiles(self) -> None:
+		"""
+		Creates empty bitmasks for both players.
+		"""
+		self.masks = get_masks(self.size, self.end_count)
+		self.stride = self.masks.stride
+		self.x_bits = 0
+		self.o_bits = 0
+
+	def copy_tiles(self, board: Board) -> None:
+		"""
+		Copies bitmasks to another board of the same size.
+		:param board: BitBoard where the bitmasks are copied to
+		"""
+		board.masks = self.masks
+		board.stride = self.stride
+		board.x_bits = self.x_bits
+		board.o_bits = self.o_bits
+
+	def is_valid_move(self, position: Point) -> bool:
+		"""
+		CHeck if the move is valid - is to the empty tile.
+		:param position: Point with position of the move
+		:return: True if move is valid, False otherwise
+		"""
+		bit = 1 << (position.x*self.stride + position.y)
+		return not (self.x_bits | self.o_bits) & bit
+
+	def get_tile(self, x: int, y: int) -> int:
+		"""
+		Returns value of the tile on given position.
+		:param x: x position on board
+		:param y: y position on board
+		:return: 1 for X mark, -1 for O mark and 0 for empty tile
+		"""
+		bit = 1 << (x*self.stride + y)
+		if self.x_bits & bit:
+			return 1
+		if self.o_bits & bit:
+			return -1
+		return 0
+
+	def get_tile_by_index(self, index: int) -> int:
+		"""
+		Returns value of the tile with given index.
+		:param index: Index of the tile (x*size + y)
+		:return: 1 for X mark, -1 for O mark and 0 for empty tile
+		"""
+		bit = self.masks.bits[index]
+		if self.x_bits & bit:
+			return 1
+		if self.o_bits & bit:
+			return -1
+		return 0
+
+	def set_tile(self, x: int, y: int, value: int) -> None:
+		"""
+		Sets value of the tile on given position.
+		:param x: x position on board
+		:param y: y position on board
+		:param value: 1 for X mark, -1 for O mark and 0 for empty tile
+		"""
+		self.set_tile_by_index(x*self.size + y, value)
+
+	def set_tile_by_index(self, index: int, value: int) -> None:
+		"""
+		Sets value of the tile with given index.
+		:param index: Index of the tile (x*size + y)
+		:param value: 1 for X mark, -1 for O mark and 0 for empty tile
+		"""
+		bit = self.masks.bits[index]
+		self.x_bits &= ~bit
+		self.o_bits &= ~bit
+		if value == 1:
+			self.x_bits |= bit
+		elif value == -1:
+			self.o_bits |= bit
+
+	def check_end(self) -> Optional[List[Point]]:
+		"""
+		Check if the game ends meaning that one of the players
+		have `end_count` marks in row, column or diagonale.
+		:return: None if game can continue. Otherwies returns list of Points
+				 with positions of winning marks or empty list when game ends in draw.
+		"""
+		if self.last_move is not None:
+			result = self.check_move(self.last_move)
+		else:
+			result = None
+			for bits in [self.x_bits, self.o_bits]:
+				start = self.find_line_start(bits)
+				if start is not None:
+					result = self.check_move(self.masks.points[start])
+					break
+
+		if result is not None:
+			return result
+		if self.empty_count == 0:
+			return []
+		return None
+
+	def find_line_start(self, bits: int) -> Optional[int]:
+		"""
+		Finds `end_count` marks in a row anywhere in given bitmask.
+		:param bits: Bitmask with marks of one player
+		:return: None if there is no such line, otherwise index of bit where the line starts.
+		"""
+		for shift in self.masks.shifts:
+			line = bits
+			for i in range(1, self.end_count):
+				line &= bits >> (i*shift)
+			if line:
+				return (line & -line).bit_length() - 1
+		return None
+
+	def check_move(self, position: Point) -> Optional[List[Point]]:
+		"""
+		Checks if the mark on given position is part of row, column or diagonale
+		of at least `end_count` marks. Only the four lines through the position are
+		checked using precomputed line masks.
+		:param position: Point with position of the move to check
+		:return: None if the move did not win. Otherwise returns list of Points
+				 with positions of winning marks.
+		"""
+		index = position.x*self.stride + position.y
+		bit = 1 << index
+		if self.x_bits & bit:
+			bits = self.x_bits
+		elif self.o_bits & bit:
+			bits = self.o_bits
+		else:
+			return None
+
+		for d in range(4):
+			shift = self.masks.shifts[d]
+			line = bits & self.masks.line_masks[d][index]
+			run = line
+			for i in range(1, self.end_count):
+				run &= line >> (i*shift)
+			if run:
+				return self.get_line_points(bits, index, d)
+		return None
+
+	def get_line_points(self, bits: int, index: int, d: int) -> List[Point]:
+		"""
+		Creates list of Points of consecutive marks through given tile in direction d.
+		:param bits: Bitmask with marks of the player
+		:param index: Bit index of the tile
+		:param d: Index of the direction in BitBoardMasks.directions
+		:return: List of Points of the marks ordered along the direction
+		"""
+		shift = self.masks.shifts[d]
+		start = index
+		while start - shift >= 0 and bits >> (start - shift) & 1:
+			start -= shift
+		result = []
+		while bits >> start & 1:
+			result.append(self.masks.points[start])
+			start += shift
+		return result
+
+	def get_empty_tiles(self) -> List[Point]:
+		"""
+		Returns list of empty tiles on board.
+		:return: List of empty board tiles.
+		"""
+		return self.get_points(self.masks.board_mask & ~(self.x_bits | self.o_bits))
+
+	def get_points(self, bits: int) -> List[Point]:
+		"""
+		Converts bitmask to list of Points.
+		:param bits: Bitmask of tiles
+		:return: List of Points of all set bits ordered by x and y
+		"""
+		points = []
+		while bits:
+			low = bits & -bits
+			points.append(self.masks.points[low.bit_length() - 1])
+			bits ^= low
+		return points
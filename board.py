@@ -1,57 +1,355 @@
 from utils import Point, Mark
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+import random
+import threading
+
+
+_zobrist_cache: Dict[int, Tuple[List[int], List[int]]] = {}
+_points_cache: Dict[int, List[Point]] = {}
+_symmetries_cache: Dict[int, List[List[int]]] = {}
+_symmetric_zobrist_cache: Dict[int, Tuple[List[List[int]], List[List[int]]]] = {}
+_neighbors_cache: Dict[Tuple[int, int], List[List[int]]] = {}
+_lines_cache: Dict[Tuple[int, int], List[List[Tuple[List[int], int]]]] = {}
+
+# Steps of the four line directions, lines of get_line_table() use the same order
+DIRECTIONS = [[1,0], [1,1], [0,1], [1,-1]]
+
+# Index of inverse symmetry for each symmetry of get_symmetries()
+INVERSE_SYMMETRIES = [0, 3, 2, 1, 4, 5, 6, 7]
+
+# Guards counts of boards sharing storage (see Board.snapshot()). It is reentrant because
+# garbage collection may release a board while the lock is held.
+_share_lock = threading.RLock()
+
+
+def get_zobrist_keys(size: int) -> Tuple[List[int], List[int]]:
+	"""
+	Returns random 64-bit Zobrist keys for X and O mark on every tile of the board.
+	Keys are generated from fixed seed so they are the same in every process.
+	:param size: Size of the board
+	:return: Tuple of lists with keys for X and O marks indexed by x*size + y
+	"""
+	if size not in _zobrist_cache:
+		rng = random.Random(size)
+		x_keys = [rng.getrandbits(64) for i in range(size*size)]
+		o_keys = [rng.getrandbits(64) for i in range(size*size)]
+		_zobrist_cache[size] = (x_keys, o_keys)
+	return _zobrist_cache[size]
+
+
+def get_board_points(size: int) -> List[Point]:
+	"""
+	Returns Points of all tiles of the board so they do not have to be created again.
+	:param size: Size of the board
+	:return: List of Points indexed by x*size + y
+	"""
+	if size not in _points_cache:
+		_points_cache[size] = [Point(x, y) for x in range(size) for y in range(size)]
+	return _points_cache[size]
+
+
+def get_neighbor_table(size: int, radius: int) -> List[List[int]]:
+	"""
+	Returns indexes of tiles at most `radius` tiles (in any direction) from every tile.
+	:param size: Size of the board
+	:param radius: Distance of the neighbors
+	:return: List indexed by x*size + y of lists of indexes of neighbors including the tile
+	"""
+	key = (size, radius)
+	if key not in _neighbors_cache:
+		_neighbors_cache[key] = [[nx*size + ny
+								  for nx in range(max(0, x - radius), min(size, x + radius + 1))
+								  for ny in range(max(0, y - radius), min(size, y + radius + 1))]
+								 for x in range(size) for y in range(size)]
+	return _neighbors_cache[key]
+
+
+def get_line_table(size: int, end_count: int) -> List[List[Tuple[List[int], int]]]:
+	"""
+	Returns tiles of the lines through every tile in the four DIRECTIONS that are less
+	than `end_count` steps from the tile - all windows of `end_count` tiles with the tile fit in them.
+	:param size: Size of the board
+	:param end_count: Number of marks in a row necessary for winning
+	:return: List indexed by x*size + y of 4 tuples (one per direction) of list of indexes
+			 of the line ordered along the direction and position of the tile in the list
+	"""
+	key = (size, end_count)
+	if key not in _lines_cache:
+		table = []
+		for x in range(size):
+			for y in range(size):
+				lines = []
+				for dx, dy in DIRECTIONS:
+					line = []
+					center = 0
+					for i in range(-end_count + 1, end_count):
+						lx = x + i*dx
+						ly = y + i*dy
+						if 0 <= lx < size and 0 <= ly < size:
+							if i == 0:
+								center = len(line)
+							line.append(lx*size + ly)
+					lines.append((line, center))
+				table.append(lines)
+		_lines_cache[key] = table
+	return _lines_cache[key]
+
+
+def get_symmetries(size: int) -> List[List[int]]:
+	"""
+	Returns the 8 symmetries of the square board - identity, rotations by 90, 180 and 270
+	degrees and reflections over both axes and both diagonals.
+	:param size: Size of the board
+	:return: List of 8 permutations, symmetries[s][x*size + y] is index of the tile where
+			 symmetry s moves tile [x,y]
+	"""
+	if size not in _symmetries_cache:
+		n = size - 1
+		transforms = [
+			lambda x, y: (x, y),
+			lambda x, y: (y, n - x),
+			lambda x, y: (n - x, n - y),
+			lambda x, y: (n - y, x),
+			lambda x, y: (x, n - y),
+			lambda x, y: (y, x),
+			lambda x, y: (n - x, y),
+			lambda x, y: (n - y, n - x),
+		]
+		symmetries = []
+		for transform in transforms:
+			permutation = []
+			for x in range(size):
+				for y in range(size):
+					tx, ty = transform(x, y)
+					permutation.append(tx*size + ty)
+			symmetries.append(permutation)
+		_symmetries_cache[size] = symmetries
+	return _symmetries_cache[size]
+
+
+def get_symmetric_zobrist_keys(size: int) -> Tuple[List[List[int]], List[List[int]]]:
+	"""
+	Returns Zobrist keys of X and O mark on every tile in all 8 symmetric variants of the board.
+	:param size: Size of the board
+	:return: Tuple of lists for X and O marks indexed by x*size + y, every item is list
+			 of keys of the tile moved by each symmetry of get_symmetries()
+	"""
+	if size not in _symmetric_zobrist_cache:
+		symmetries = get_symmetries(size)
+		x_keys, o_keys = get_zobrist_keys(size)
+		_symmetric_zobrist_cache[size] = tuple(
+			[[keys[symmetry[index]] for symmetry in symmetries] for index in range(size*size)]
+			for keys in [x_keys, o_keys])
+	return _symmetric_zobrist_cache[size]
 
 
 class Board:
 	"""
 	Represents the game board.
+	Board keeps set of candidate tiles - empty tiles that are at most
+	`candidate_radius` tiles (in any direction) from some mark.
+	Snapshots of the board share its storage until one of them is changed (copy-on-write).
 	"""
-	def __init__(self, size: int, end_count: int = 4) -> None:
+	def __init__(self, size: int, end_count: int = 4, candidate_radius: int = 1) -> None:
 		self.size = size
-		self.tiles = []
 		self.end_count = end_count
+		self.last_move = None
+		self.move_stack = []
+		self.empty_count = size * size
+		self.zobrist_keys = get_zobrist_keys(size)
+		# Zobrist hash of the position updated incrementally with every move
+		self.zobrist_key = 0
+		self.symmetric_zobrist_keys = get_symmetric_zobrist_keys(size)
+		# Zobrist hashes of the 8 symmetric variants of the position, the first one is zobrist_key
+		self.symmetric_keys = [0] * 8
+		self.points = get_board_points(size)
+		self.lines = get_line_table(size, end_count)
+		self.candidate_radius = candidate_radius
+		self.neighbors = get_neighbor_table(size, candidate_radius)
+		# Number of marks within candidate_radius of every tile (indexed by x*size + y)
+		self.neighbor_counts = [0] * (size*size)
+		# Indexes of candidate tiles
+		self.candidates = set()
+		# Number of boards sharing the storage in one-item list shared by them, storage
+		# is copied before a change when the number is larger than one
+		self.sharers = [1]
+		self.init_tiles()
 
-		for i in range(self.size):
-			self.tiles.append([0]*self.size)
+	def init_tiles(self) -> None:
+		"""
+		Creates storage for empty board tiles - one list indexed by x*size + y.
+		"""
+		self.tiles = [0] * (self.size*self.size)
 
 	def copy(self):
 		"""
 		Creates copy of the board to prevent slow deepcopy method unusable in minimax.
 		:return: Copy of this Board object
 		"""
-		b = Board(self.size, self.end_count)
-		for x in range(self.size):
-			for y in range(self.size):
-				b.tiles[x][y] = self.tiles[x][y]
+		b = self.__class__.__new__(self.__class__)
+		b.size = self.size
+		b.end_count = self.end_count
+		b.last_move = self.last_move
+		b.move_stack = self.move_stack.copy()
+		b.empty_count = self.empty_count
+		b.zobrist_keys = self.zobrist_keys
+		b.zobrist_key = self.zobrist_key
+		b.symmetric_zobrist_keys = self.symmetric_zobrist_keys
+		b.symmetric_keys = self.symmetric_keys.copy()
+		b.points = self.points
+		b.lines = self.lines
+		b.candidate_radius = self.candidate_radius
+		b.neighbors = self.neighbors
+		b.neighbor_counts = self.neighbor_counts.copy()
+		b.candidates = self.candidates.copy()
+		b.sharers = [1]
+		self.copy_tiles(b)
+		return b
+
+	def snapshot(self) -> 'Board':
+		"""
+		Creates copy of the board in O(1) that shares storage of tiles, moves and candidates
+		with this board. Whichever of the boards is changed first copies the storage before
+		the change, so changes of one never show in the other. Snapshot that is released
+		(see release()) or deleted before it is changed does not make the board copy the storage.
+		Snapshot and the board may be used by different threads, but one board must not be used
+		by two threads at once.
+		:return: Snapshot of this Board object
+		"""
+		b = self.__class__.__new__(self.__class__)
+		b.__dict__.update(self.__dict__)
+		with _share_lock:
+			self.sharers[0] += 1
 		return b
 
+	def release(self) -> None:
+		"""
+		Tells that the board will not be used any more, so boards sharing its storage
+		do not have to copy it before their changes. Changing released board raises TypeError.
+		"""
+		with _share_lock:
+			if self.sharers[0] > 1:
+				self.sharers[0] -= 1
+			self.sharers = None
+
+	def unshare(self) -> None:
+		"""
+		Makes private copy of the storage shared with snapshots. It is called before every change.
+		"""
+		with _share_lock:
+			if self.sharers[0] == 1:
+				return
+			self.move_stack = self.move_stack.copy()
+			self.symmetric_keys = self.symmetric_keys.copy()
+			self.neighbor_counts = self.neighbor_counts.copy()
+			self.candidates = self.candidates.copy()
+			self.copy_tiles(self)
+			# Other boards may change the storage after the count drops, it is copied already
+			self.sharers[0] -= 1
+			self.sharers = [1]
+
+	def copy_tiles(self, board: 'Board') -> None:
+		"""
+		Copies tiles storage to another board of the same size.
+		:param board: Board where the tiles are copied to
+		"""
+		board.tiles = self.tiles.copy()
+
 	def is_valid_move(self, position: Point) -> bool:
 		"""
 		CHeck if the move is valid - is to the empty tile.
 		:param position: Point with position of the move
 		:return: True if move is valid, False otherwise
 		"""
-		if self.tiles[position.x][position.y] == 0:
-			return True
-		return False
+		return self.tiles[position.x*self.size + position.y] == 0
+
+	def get_tile(self, x: int, y: int) -> int:
+		"""
+		Returns value of the tile on given position.
+		:param x: x position on board
+		:param y: y position on board
+		:return: 1 for X mark, -1 for O mark and 0 for empty tile
+		"""
+		return self.tiles[x*self.size + y]
+
+	def get_tile_by_index(self, index: int) -> int:
+		"""
+		Returns value of the tile with given index.
+		:param index: Index of the tile (x*size + y)
+		:return: 1 for X mark, -1 for O mark and 0 for empty tile
+		"""
+		return self.tiles[index]
+
+	def set_tile(self, x: int, y: int, value: int) -> None:
+		"""
+		Sets value of the tile on given position.
+		:param x: x position on board
+		:param y: y position on board
+		:param value: 1 for X mark, -1 for O mark and 0 for empty tile
+		"""
+		self.set_tile_by_index(x*self.size + y, value)
+
+	def set_tile_by_index(self, index: int, value: int) -> None:
+		"""
+		Sets value of the tile with given index.
+		:param index: Index of the tile (x*size + y)
+		:param value: 1 for X mark, -1 for O mark and 0 for empty tile
+		"""
+		if self.sharers[0] > 1:
+			self.unshare()
+		self.tiles[index] = value
 
 	def check_end(self) -> Optional[List[Point]]:
 		"""
 		Check if the game ends meaning that one of the players 
-		have `end_count` marks in row, column or diagonale
+		have `end_count` marks in row, column or diagonale.
+		Game ends with the first winning move so only lines through the last move
+		are checked. Full board scan is used only when the last move is unknown.
 		:return: None if game can continue. Otherwies returns list of Points
 				 with positions of winning marks or empty list when game ends in draw.
 		"""
-		for x in range(self.size):
-			for y in range(self.size):
-				if not self.tiles[x][y] == 0:
-					result = self.check_around(x, y)
-					if result is not None:
-						return result
-		if len(self.get_empty_tiles()) == 0:
+		if self.last_move is not None:
+			result = self.check_move(self.last_move)
+			if result is not None:
+				return result
+			if self.empty_count == 0:
+				return []
+			return None
+
+		for index, tile in enumerate(self.tiles):
+			if tile != 0:
+				result = self.check_around(index // self.size, index % self.size)
+				if result is not None:
+					return result
+		if self.empty_count == 0:
 			return []
 		return None
 	
+	def check_move(self, position: Point) -> Optional[List[Point]]:
+		"""
+		Checks if the mark on given position is part of row, column or diagonale
+		of at least `end_count` marks. Only the four lines through the position
+		(from get_line_table()) are scanned.
+		:param position: Point with position of the move to check
+		:return: None if the move did not win. Otherwise returns list of Points
+				 with positions of winning marks.
+		"""
+		tiles = self.tiles
+		mark = tiles[position.x*self.size + position.y]
+		if mark == 0:
+			return None
+
+		for line, center in self.lines[position.x*self.size + position.y]:
+			start = center
+			while start > 0 and tiles[line[start - 1]] == mark:
+				start -= 1
+			end = center + 1
+			while end < len(line) and tiles[line[end]] == mark:
+				end += 1
+			if end - start >= self.end_count:
+				return [self.points[index] for index in line[start:end]]
+		return None
+
 	def check_around(self, x: int, y: int) -> Optional[List[str]]:
 		"""
 		Checks all 8 direction from given position for row, column or diagonale
@@ -76,16 +374,16 @@ class Board:
 		:return: None if game can continue. Otherwies returns list of Points
 				 of winning marks.
 		"""
-		result = [Point(x,y)]
-		mark = self.tiles[x][y]
+		result = [self.points[x*self.size + y]]
+		mark = self.tiles[x*self.size + y]
 		for i in range(self.end_count-1):
 			x += dx
 			y += dy
 			if x >= 0 and y >= 0 and x < self.size and y < self.size:
-				if not self.tiles[x][y] == mark:
+				if not self.tiles[x*self.size + y] == mark:
 					return None
 				else:
-					result.append(Point(x,y))
+					result.append(self.points[x*self.size + y])
 			else:
 				return None
 		return result
@@ -96,36 +394,144 @@ class Board:
 		:param position: Point where the move was made
 		:mark: Mark of the player that made the move (X or O)
 		"""
+		if self.sharers[0] > 1:
+			self.unshare()
+		index = position.x*self.size + position.y
+		if self.get_tile_by_index(index) == 0:
+			self.empty_count -= 1
+
 		if mark == Mark.X:
-			self.tiles[position.x][position.y] = 1
+			self.set_tile_by_index(index, 1)
+			self.zobrist_key ^= self.zobrist_keys[0][index]
+			self.update_symmetric_keys(self.symmetric_zobrist_keys[0][index])
 		else:
-			self.tiles[position.x][position.y] = -1
+			self.set_tile_by_index(index, -1)
+			self.zobrist_key ^= self.zobrist_keys[1][index]
+			self.update_symmetric_keys(self.symmetric_zobrist_keys[1][index])
+		self.last_move = position
+		self.move_stack.append(position)
+		self.candidates.discard(index)
+		self.update_neighbors(index, 1)
+
+	def undo_move(self) -> Point:
+		"""
+		Takes back the last move made with set_move().
+		:return: Point with position of the removed mark
+		"""
+		if self.sharers[0] > 1:
+			self.unshare()
+		position = self.move_stack.pop()
+		index = position.x*self.size + position.y
+		if self.get_tile_by_index(index) == 1:
+			self.zobrist_key ^= self.zobrist_keys[0][index]
+			self.update_symmetric_keys(self.symmetric_zobrist_keys[0][index])
+		else:
+			self.zobrist_key ^= self.zobrist_keys[1][index]
+			self.update_symmetric_keys(self.symmetric_zobrist_keys[1][index])
+		self.set_tile_by_index(index, 0)
+		self.update_neighbors(index, -1)
+		self.empty_count += 1
+		if self.move_stack:
+			self.last_move = self.move_stack[-1]
+		else:
+			self.last_move = None
+		return position
+
+	def update_symmetric_keys(self, keys: List[int]) -> None:
+		"""
+		Adds or removes mark from Zobrist hashes of all symmetric variants of the position.
+		:param keys: Keys of the mark in every symmetric variant
+		"""
+		k = self.symmetric_keys
+		k[0] ^= keys[0]
+		k[1] ^= keys[1]
+		k[2] ^= keys[2]
+		k[3] ^= keys[3]
+		k[4] ^= keys[4]
+		k[5] ^= keys[5]
+		k[6] ^= keys[6]
+		k[7] ^= keys[7]
 
 	def get_empty_tiles(self) -> List[Point]:
 		"""
 		Returns list of empty tiles on board.
 		:return: List of empty board tiles.
 		"""
-		empty_tiles = []
-		for x in range(self.size):
-			for y in range(self.size):
-				if self.tiles[x][y] == 0:
-					empty_tiles.append(Point(x,y))
-		return empty_tiles
+		return [self.points[index] for index, tile in enumerate(self.tiles) if tile == 0]
+
+	def update_neighbors(self, index: int, change: int) -> None:
+		"""
+		Updates number of neighboring marks of all tiles within candidate_radius
+		of the tile and adds or removes them from candidates.
+		:param index: Index (x*size + y) of the tile where the mark was added or removed
+		:param change: 1 when mark was added, -1 when it was removed
+		"""
+		counts = self.neighbor_counts
+		for neighbor in self.neighbors[index]:
+			count = counts[neighbor] + change
+			counts[neighbor] = count
+			if count == 0:
+				self.candidates.discard(neighbor)
+			elif self.get_tile_by_index(neighbor) == 0:
+				self.candidates.add(neighbor)
+
+	def set_candidate_radius(self, radius: int) -> None:
+		"""
+		Changes candidate_radius and recomputes candidate tiles.
+		:param radius: New radius
+		"""
+		# New counts and candidates replace the shared ones, so the storage is not copied
+		self.candidate_radius = radius
+		self.neighbors = get_neighbor_table(self.size, radius)
+		self.neighbor_counts = [0] * (self.size*self.size)
+		self.candidates = set()
+		for position in self.move_stack:
+			self.update_neighbors(position.x*self.size + position.y, 1)
 
 	def get_candidate_tiles(self) -> List[Point]:
 		"""
-		Returns list of all empty positions neighboring already placed marks
+		Returns list of all empty positions that are at most candidate_radius
+		from already placed marks. On empty board it is the center of the board.
 		:return: List of Points with empty position suitable for new mark
 		"""
-		empty_tiles = set()
-		for x in range(self.size):
-			for y in range(self.size):
-				if not self.tiles[x][y] == 0:
-					for d in [[0,1], [1,1], [1,0], [1,-1], [0,-1], [-1,-1], [-1,0], [-1,1]]:
-						if x+d[0] >= 0 and y+d[1] >= 0 and x+d[0] < self.size and y+d[1] < self.size and self.tiles[x+d[0]][y+d[1]] == 0:
-							empty_tiles.add(Point(x+d[0],y+d[1]))
-		return list(empty_tiles)
+		if self.empty_count == self.size*self.size:
+			return [self.points[self.size // 2 * self.size + self.size // 2]]
+		return [self.points[index] for index in self.candidates]
+
+	def get_canonical_key(self) -> Tuple[int, int]:
+		"""
+		Computes Zobrist key that is the same for all symmetric positions - the smallest
+		key of the 8 symmetric variants of the board.
+		:return: Tuple of the canonical key and index of the symmetry (in get_symmetries())
+				 that transforms this board to the canonical position
+		"""
+		key = min(self.symmetric_keys)
+		return key, self.symmetric_keys.index(key)
+
+	def to_canonical(self, position: Point, symmetry: int) -> Point:
+		"""
+		Transforms position on this board to the canonical position.
+		:param position: Point on this board
+		:param symmetry: Symmetry returned by get_canonical_key()
+		:return: Point in the canonical position
+		"""
+		return self.points[get_symmetries(self.size)[symmetry][position.x*self.size + position.y]]
+
+	def from_canonical(self, position: Point, symmetry: int) -> Point:
+		"""
+		Transforms position in the canonical position back to this board.
+		:param position: Point in the canonical position
+		:param symmetry: Symmetry returned by get_canonical_key()
+		:return: Point on this board
+		"""
+		return self.points[get_symmetries(self.size)[INVERSE_SYMMETRIES[symmetry]][position.x*self.size + position.y]]
+
+	def __del__(self):
+		# Released snapshot no longer shares the storage
+		sharers = self.__dict__.get('sharers')
+		if sharers is not None and sharers[0] > 1:
+			with _share_lock:
+				sharers[0] -= 1
 
 	def get_hash_string(self) -> str:
 		"""
@@ -134,22 +540,45 @@ class Board:
 		"""
 		s = ''
 		for i in range(self.size):
-			s += ''.join(map(str,self.tiles[i]))
+			s += ''.join(str(self.get_tile(i, y)) for y in range(self.size))
 		return s
 
+	def __getstate__(self):
+		# Zobrist keys, Points and tables are shared by all boards of the same size, there is no need to pickle them
+		state = self.__dict__.copy()
+		del state['zobrist_keys']
+		del state['symmetric_zobrist_keys']
+		del state['points']
+		del state['lines']
+		del state['neighbors']
+		del state['sharers']
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.zobrist_keys = get_zobrist_keys(self.size)
+		self.symmetric_zobrist_keys = get_symmetric_zobrist_keys(self.size)
+		self.points = get_board_points(self.size)
+		self.lines = get_line_table(self.size, self.end_count)
+		self.neighbors = get_neighbor_table(self.size, self.candidate_radius)
+		self.sharers = [1]
+
 	def __eq__(self, other):
+		if self.zobrist_key != other.zobrist_key:
+			return False
 		return self.get_hash_string() == other.get_hash_string()
 
 	def __hash__(self):
-		return hash(self.get_hash_string())
+		return self.zobrist_key
 
 	def __repr__(self):
 		s = ''
 		for x in range(self.size):
 			for y in range(self.size):
-				if self.tiles[x][y] == 0:
+				tile = self.get_tile(x, y)
+				if tile == 0:
 					s += '_ '
-				elif self.tiles[x][y] == 1:
+				elif tile == 1:
 					s += 'x '
 				else:
 					s += 'o '
@@ -0,0 +1,264 @@
+from board import Board
+from minimax import MiniMax, TranspositionTable
+from utils import Point, Mark
+from typing import Dict, List, Optional, Tuple
+import argparse
+import mmap
+import random
+import struct
+
+
+# File starts with magic, version, board size, end_count and number of entries
+BOOK_MAGIC = b'GMKB'
+BOOK_VERSION = 1
+HEADER = struct.Struct('<4sIIIQ')
+KEY = struct.Struct('<Q')
+MOVE = struct.Struct('<H')
+# Largest weight of one entry, weights are stored as 16-bit numbers
+MAX_WEIGHT = 2**16 - 1
+
+
+class OpeningBook:
+	"""
+	Opening book stored in a binary file that is memory-mapped. The file has a header
+	followed by three arrays of the same length - sorted canonical position keys (64 bits),
+	moves as tile indexes in the canonical position (16 bits) and weights of the moves
+	(16 bits). Position may have more entries, one for every book move.
+	Lookup is a binary search in the mapped keys so it does not read the whole file
+	and all processes using the same book share its pages.
+	Keys are canonical (see Board.get_canonical_key()) so one entry serves all 8
+	symmetric positions. All numbers are little-endian on every machine.
+	"""
+	def __init__(self, path: str) -> None:
+		self.path = path
+		with open(path, 'rb') as f:
+			self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, version, self.size, self.end_count, self.count = HEADER.unpack_from(self.data)
+		if magic != BOOK_MAGIC or version != BOOK_VERSION:
+			raise ValueError(f'{path} is not an opening book of version {BOOK_VERSION}')
+
+		# Offsets of the arrays in the file
+		self.keys_start = HEADER.size
+		self.moves_start = self.keys_start + 8*self.count
+		self.weights_start = self.moves_start + 2*self.count
+		if len(self.data) < self.weights_start + 2*self.count:
+			raise ValueError(f'{path} is not complete')
+
+	def get_key(self, i: int) -> int:
+		"""
+		:param i: Index of the entry
+		:return: Key of the entry
+		"""
+		return KEY.unpack_from(self.data, self.keys_start + 8*i)[0]
+
+	def get_move(self, board: Board) -> Optional[Point]:
+		"""
+		Finds the book move with the largest weight for the position.
+		:param board: Board with the position
+		:return: Point with the move or None when the position is not in the book
+		"""
+		if board.size != self.size or board.end_count != self.end_count:
+			return None
+		key, symmetry = board.get_canonical_key()
+		# Binary search of the first entry of the position
+		low = 0
+		high = self.count
+		while low < high:
+			middle = (low + high) // 2
+			if self.get_key(middle) < key:
+				low = middle + 1
+			else:
+				high = middle
+		i = low
+		best_index = -1
+		best_weight = -1
+		while i < self.count and self.get_key(i) == key:
+			weight = MOVE.unpack_from(self.data, self.weights_start + 2*i)[0]
+			if weight > best_weight:
+				best_weight = weight
+				best_index = MOVE.unpack_from(self.data, self.moves_start + 2*i)[0]
+			i += 1
+		if best_index < 0:
+			return None
+
+		move = board.from_canonical(board.points[best_index], symmetry)
+		if not board.is_valid_move(move):
+			return None
+		return move
+
+	def __len__(self) -> int:
+		return self.count
+
+	def close(self) -> None:
+		"""
+		Unmaps the file.
+		"""
+		self.data.close()
+
+
+_books_cache: Dict[str, OpeningBook] = {}
+
+
+def get_opening_book(path: str) -> OpeningBook:
+	"""
+	Returns opening book from the file. Every file is mapped only once in each process.
+	:param path: Path to the book file
+	:return: OpeningBook
+	"""
+	if path not in _books_cache:
+		_books_cache[path] = OpeningBook(path)
+	return _books_cache[path]
+
+
+class BookBuilder:
+	"""
+	Collects book moves from searches and games and writes them to a book file.
+	Weights of the same move in the same (symmetric) position are summed.
+	"""
+	def __init__(self, size: int, end_count: int) -> None:
+		self.size = size
+		self.end_count = end_count
+		# Weight of every (canonical key, canonical move index)
+		self.entries: Dict[Tuple[int, int], int] = {}
+
+	def add_move(self, board: Board, move: Point, weight: int = 1) -> None:
+		"""
+		Adds move in the position to the book.
+		:param board: Board with the position
+		:param move: Point with the move
+		:param weight: Weight of the move, moves with larger weight are preferred
+		"""
+		key, symmetry = board.get_canonical_key()
+		move = board.to_canonical(move, symmetry)
+		index = move.x*self.size + move.y
+		self.entries[(key, index)] = min(MAX_WEIGHT, self.entries.get((key, index), 0) + weight)
+
+	def add_game(self, moves: List[Point], winner: Optional[Mark], plies: int) -> None:
+		"""
+		Adds moves of the winner from the beginning of the game.
+		:param moves: List of Points with all moves of the game, X moves first
+		:param winner: Mark of the winner, nothing is added for draw
+		:param plies: Number of moves from the beginning of the game that are added
+		"""
+		if winner is None:
+			return
+		board = Board(self.size, self.end_count)
+		for i, move in enumerate(moves[:plies]):
+			mark = Mark.X if i % 2 == 0 else Mark.O
+			if mark == winner:
+				self.add_move(board, move)
+			board.set_move(move, mark)
+
+	def search(self, plies: int, max_depth: int, width: int, time_limit_ms: Optional[int] = None) -> None:
+		"""
+		Searches all positions reachable from the empty board by `width` best moves
+		of each player in the first `plies` moves and adds the best move of every position.
+		Symmetric positions and moves are searched only once.
+		:param plies: Number of moves from the beginning of the game
+		:param max_depth: Depth of the search of every move
+		:param width: Number of best moves that are expanded in every position
+		:param time_limit_ms: Time limit of the search of every move, None for fixed depth
+		"""
+		table = TranspositionTable()
+		positions = [Board(self.size, self.end_count)]
+		for ply in range(plies):
+			mark = Mark.X if ply % 2 == 0 else Mark.O
+			next_positions = {}
+			for board in positions:
+				# Root search cuts off moves that are not better than the best one, so every
+				# move is searched alone to get exact values of all alternatives
+				moves = []
+				for position in self.get_distinct_moves(board, mark):
+					mm = MiniMax(board, mark, max_depth, table, time_limit_ms, root_moves=[position])
+					mm.compute()
+					moves += mm.moves
+				moves.sort(key=lambda m: (m.value, m.get_score()), reverse=True)
+				if len(moves) == 0:
+					continue
+				self.add_move(board, moves[0].position, max_depth)
+				for move in moves[:width]:
+					child = board.copy()
+					child.set_move(move.position, mark)
+					if child.check_end() is None:
+						next_positions[child.get_canonical_key()[0]] = child
+			positions = list(next_positions.values())
+
+	def get_distinct_moves(self, board: Board, mark: Mark) -> List[Point]:
+		"""
+		:param board: Board with the position, it is the same after the call
+		:param mark: Mark of the player on move
+		:return: List of Points with one candidate move of every group of symmetric moves
+		"""
+		keys = set()
+		moves = []
+		for position in board.get_candidate_tiles():
+			board.set_move(position, mark)
+			key = board.get_canonical_key()[0]
+			board.undo_move()
+			if key not in keys:
+				keys.add(key)
+				moves.append(position)
+		return moves
+
+	def self_play(self, games: int, plies: int, max_depth: int, random_plies: int = 2, time_limit_ms: Optional[int] = None) -> None:
+		"""
+		Plays games of MiniMax against itself and adds moves of winners. First
+		`random_plies` moves are random candidate moves so the games differ.
+		:param games: Number of games
+		:param plies: Number of moves from the beginning of the game that are added
+		:param max_depth: Depth of the search of every move
+		:param random_plies: Number of random moves at the beginning of every game
+		:param time_limit_ms: Time limit of every move, None for fixed depth
+		"""
+		table = TranspositionTable()
+		for game in range(games):
+			board = Board(self.size, self.end_count)
+			mark = Mark.X
+			winner = None
+			while True:
+				if len(board.move_stack) < random_plies:
+					move = random.choice(board.get_candidate_tiles())
+				else:
+					mm = MiniMax(board, mark, max_depth, table, time_limit_ms)
+					mm.compute()
+					move = mm.get_best_move()
+				board.set_move(move, mark)
+				result = board.check_end()
+				if result is not None:
+					winner = mark if len(result) > 0 else None
+					break
+				mark = Mark.X if mark == Mark.O else Mark.O
+			self.add_game(board.move_stack, winner, plies)
+
+	def write(self, path: str) -> None:
+		"""
+		Writes the book file.
+		:param path: Path of the file
+		"""
+		entries = sorted(self.entries.items())
+		with open(path, 'wb') as f:
+			f.write(HEADER.pack(BOOK_MAGIC, BOOK_VERSION, self.size, self.end_count, len(entries)))
+			f.write(struct.pack(f'<{len(entries)}Q', *[key for (key, index), weight in entries]))
+			f.write(struct.pack(f'<{len(entries)}H', *[index for (key, index), weight in entries]))
+			f.write(struct.pack(f'<{len(entries)}H', *[weight for (key, index), weight in entries]))
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Builds opening book from deep searches or self-play.')
+	parser.add_argument('output', help='Path of the book file')
+	parser.add_argument('--board-size', type=int, default=10)
+	parser.add_argument('--end-count', type=int, default=4)
+	parser.add_argument('--plies', type=int, default=4, help='Number of moves from the beginning of the game in the book')
+	parser.add_argument('--depth', type=int, default=4, help='Depth of the search of every move')
+	parser.add_argument('--time-limit-ms', type=int, help='Time limit of the search of every move')
+	parser.add_argument('--width', type=int, default=2, help='Number of best moves expanded in every searched position')
+	parser.add_argument('--self-play', type=int, default=0, help='Number of self-play games added to the book')
+	args = parser.parse_args()
+
+	builder = BookBuilder(args.board_size, args.end_count)
+	if args.self_play > 0:
+		builder.self_play(args.self_play, args.plies, args.depth, time_limit_ms=args.time_limit_ms)
+	else:
+		builder.search(args.plies, args.depth, args.width, args.time_limit_ms)
+	builder.write(args.output)
+	print(f'{len(builder.entries)} entries written to {args.output}')
@@ -0,0 +1,194 @@
+from board import Board
+from utils import Point, Mark
+from typing import Dict, List, Tuple
+
+
+# Score of a move that wins the game. Static evaluation is always far below it.
+WIN_SCORE = 2**40
+# Values over this threshold are proven wins (also ones found in SolvedPositions
+# that are further than the search depth), static evaluation never gets there
+WIN_THRESHOLD = WIN_SCORE // 2
+
+
+class PatternTable:
+	"""
+	Precomputed scores of every possible window of `end_count` tiles in a line.
+	Window is encoded as base 3 number where digit is 0 for empty tile, 1 for X
+	and 2 for O mark (first tile is the lowest digit). Window that holds marks
+	of only one player scores 10^k for k marks, positive for X and negative for O.
+	Summing the scores over all windows of a line makes open patterns (that fit
+	into more windows) worth more than closed ones - open four scores twice
+	as much as four closed by opponent or board edge, open three three times
+	as much as closed three and so on.
+	"""
+	def __init__(self, end_count: int) -> None:
+		self.end_count = end_count
+		self.powers = [3**i for i in range(end_count)]
+		self.scores: List[int] = []
+		for code in range(3**end_count):
+			x_count = 0
+			o_count = 0
+			for i in range(end_count):
+				digit = code // self.powers[i] % 3
+				if digit == 1:
+					x_count += 1
+				elif digit == 2:
+					o_count += 1
+			if x_count > 0 and o_count == 0:
+				self.scores.append(10**x_count)
+			elif o_count > 0 and x_count == 0:
+				self.scores.append(-10**o_count)
+			else:
+				self.scores.append(0)
+
+
+_pattern_cache: Dict[int, PatternTable] = {}
+
+
+def get_pattern_table(end_count: int) -> PatternTable:
+	"""
+	Returns PatternTable for given end_count. Table is computed only once.
+	:param end_count: Number of marks in a row necessary for winning
+	:return: PatternTable for the end_count
+	"""
+	if end_count not in _pattern_cache:
+		_pattern_cache[end_count] = PatternTable(end_count)
+	return _pattern_cache[end_count]
+
+
+class Evaluator:
+	"""
+	Static evaluation of the board as sum of PatternTable scores of all windows
+	on the board. Score is updated incrementally - after every move only windows
+	on the four lines through the move are rescored.
+	"""
+	def __init__(self, board: Board) -> None:
+		self.size = board.size
+		self.end_count = board.end_count
+		self.table = get_pattern_table(board.end_count)
+		self.score = self.evaluate_board(board)
+
+	def evaluate_board(self, board: Board) -> int:
+		"""
+		Computes score of the whole board from scratch.
+		:param board: Board to evaluate
+		:return: Score of the board, positive when X is better
+		"""
+		n = self.end_count
+		score = 0
+		for x in range(self.size):
+			for y in range(self.size):
+				for dx, dy in [[1,0], [1,1], [0,1], [1,-1]]:
+					end_x = x + (n-1)*dx
+					end_y = y + (n-1)*dy
+					if 0 <= end_x < self.size and 0 <= end_y < self.size:
+						code = 0
+						for i in range(n):
+							code += board.get_tile(x + i*dx, y + i*dy) % 3 * self.table.powers[i]
+						score += self.table.scores[code]
+		return score
+
+	def get_line_digits(self, board: Board, index: int, d: int) -> Tuple[List[int], int]:
+		"""
+		Reads tiles of the line in direction d that are less than end_count
+		steps from the tile. Tiles of the line are taken from board.lines.
+		:param board: Board to read
+		:param index: Index (x*size + y) of the tile in the middle of the line
+		:param d: Index of the direction in DIRECTIONS of board module
+		:return: Tuple of list of window digits (0 empty, 1 X, 2 O) and index of the tile in it
+		"""
+		line, center = board.lines[index][d]
+		get_tile = board.get_tile_by_index
+		return [get_tile(i) % 3 for i in line], center
+
+	def get_move_delta(self, board: Board, position: Point) -> int:
+		"""
+		Computes how much the mark on given position adds to the score.
+		Only windows containing the position are scored.
+		:param board: Board with the mark on the position
+		:param position: Point with position of the mark
+		:return: Score with the mark minus score without the mark
+		"""
+		n = self.end_count
+		scores = self.table.scores
+		powers = self.table.powers
+		top = powers[n-1]
+		index = position.x*self.size + position.y
+		digit = board.get_tile_by_index(index) % 3
+		delta = 0
+		for d in range(4):
+			digits, center = self.get_line_digits(board, index, d)
+			if len(digits) < n:
+				continue
+			start = max(0, center - n + 1)
+			code = 0
+			for i in range(n):
+				code += digits[start + i] * powers[i]
+			while True:
+				delta += scores[code] - scores[code - digit * powers[center - start]]
+				if start == center or start + n == len(digits):
+					break
+				code = (code - digits[start]) // 3 + digits[start + n] * top
+				start += 1
+		return delta
+
+	def get_move_threats(self, board: Board, position: Point) -> Tuple[int, int]:
+		"""
+		Finds the most marks of each player in one window through the empty position
+		that has no marks of the other player. Mark on the position completes the
+		window to `end_count` when the number is `end_count` - 1.
+		:param board: Board to check
+		:param position: Point with empty position
+		:return: Tuple of the largest number of X marks and the largest number of O marks
+		"""
+		n = self.end_count
+		best_x = 0
+		best_o = 0
+		index = position.x*self.size + position.y
+		for d in range(4):
+			digits, center = self.get_line_digits(board, index, d)
+			if len(digits) < n:
+				continue
+			start = max(0, center - n + 1)
+			window = digits[start:start + n]
+			x_count = window.count(1)
+			o_count = window.count(2)
+			while True:
+				if o_count == 0 and x_count > best_x:
+					best_x = x_count
+				if x_count == 0 and o_count > best_o:
+					best_o = o_count
+				if start == center or start + n == len(digits):
+					break
+				removed = digits[start]
+				added = digits[start + n]
+				x_count += (added == 1) - (removed == 1)
+				o_count += (added == 2) - (removed == 2)
+				start += 1
+		return best_x, best_o
+
+	def on_move(self, board: Board, position: Point) -> None:
+		"""
+		Updates score after the move was made on the board.
+		:param board: Board after the move
+		:param position: Point with position of the move
+		"""
+		self.score += self.get_move_delta(board, position)
+
+	def on_undo(self, board: Board, position: Point) -> None:
+		"""
+		Updates score before the move is taken back from the board.
+		:param board: Board before the move is taken back
+		:param position: Point with position of the move
+		"""
+		self.score -= self.get_move_delta(board, position)
+
+	def get_score(self, mark: Mark) -> int:
+		"""
+		Returns score of the board from perspective of given player.
+		:param mark: Mark of the player
+		:return: Score of the board, positive when the player is better
+		"""
+		if mark == Mark.X:
+			return self.score
+		return -self.score
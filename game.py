@@ -9,11 +9,12 @@ class Game:
 	Represents the game machanics.
 	It suppose to be a Model in MVVM pattern.
 	"""
-	def __init__(self, player_x: Player, player_o: Player, end_count: int, board_size: int) -> None:
+	def __init__(self, player_x: Player, player_o: Player, end_count: int, board_size: int, board_class: type = Board) -> None:
 		self.state = GameState.INIT	
 		self.board_size = board_size
 		self.end_count = end_count
-		self.board = Board(self.board_size, self.end_count)
+		self.board_class = board_class
+		self.board = self.board_class(self.board_size, self.end_count)
 
 		self.player_x = player_x
 		self.player_x.bind_game_move(self.on_received_move)
@@ -23,6 +24,16 @@ class Game:
 
 		self.draw_mark_listener = None
 		self.end_game_listener = None
+		# Additional listeners (e.g. recording of games) of start of every game, of every move
+		# including the last one and of end of the game. They must be added before the game starts.
+		self.start_listeners: List[Callable] = []
+		self.move_listeners: List[Callable] = []
+		self.end_listeners: List[Callable] = []
+
+		# Player that should make next move and flag if some player is just making a move.
+		# Players that send move directly from move() would otherwise call it recursively.
+		self.next_player = None
+		self.is_requesting_move = False
 
 	def bind_draw_mark_listener(self, listener: Callable) -> None:
 		"""
@@ -42,6 +53,34 @@ class Game:
 		self.end_game_listener = listener
 		self.start_if_initialized()
 
+	def add_start_listener(self, listener: Callable) -> None:
+		"""
+		Adds listener of start of the game and of every restart.
+		:param listener: Method without parameters
+		"""
+		self.start_listeners.append(listener)
+
+	def add_move_listener(self, listener: Callable) -> None:
+		"""
+		Adds listener of every move, it is called before draw_mark_listener or end_game_listener.
+		:param listener: Method that must accept Point and Player
+		"""
+		self.move_listeners.append(listener)
+
+	def add_end_listener(self, listener: Callable) -> None:
+		"""
+		Adds listener of end of the game, it is called before end_game_listener.
+		:param listener: Method that must accept list of winning Points and Player
+		"""
+		self.end_listeners.append(listener)
+
+	def notify_start(self) -> None:
+		"""
+		Notifies start listeners that new game starts.
+		"""
+		for listener in self.start_listeners:
+			listener()
+
 	def start_if_initialized(self) -> None:
 		"""
 		Starts the game if it is properly initialized. That means that 
@@ -49,7 +88,31 @@ class Game:
 		"""
 		if not self.end_game_listener is None and not self.draw_mark_listener is None:
 			self.state = GameState.WAITING_FOR_X
-			self.player_x.move(self.board)
+			self.notify_start()
+			self.request_move(self.player_x)
+
+	def request_move(self, player: Player) -> None:
+		"""
+		Sends command to the player to make a move with a snapshot of the board
+		(see Board.snapshot()). When the move is requested
+		while other player is still in its move() call (it sent the move directly)
+		the request is made after that call returns, so long games of AI players
+		do not grow the call stack.
+		:param player: Player that should make the move
+		"""
+		self.next_player = player
+		if self.is_requesting_move:
+			return
+
+		self.is_requesting_move = True
+		try:
+			while self.next_player is not None:
+				player = self.next_player
+				self.next_player = None
+				# Snapshot keeps the game board safe from the player and from its background threads
+				player.move(self.board.snapshot())
+		finally:
+			self.is_requesting_move = False
 
 	def on_received_move(self, position: Point, player: Player) -> None:
 		"""
@@ -62,9 +125,13 @@ class Game:
 		if self.is_players_move(player) and self.board.is_valid_move(position):
 			self.board.set_move(position, player.mark)
 			result = self.board.check_end()
+			for listener in self.move_listeners:
+				listener(position, player)
 
 			if result is not None:
 				self.state = GameState.END
+				for listener in self.end_listeners:
+					listener(result, player)
 				self.end_game_listener(result, player)
 			else:
 				self.draw_mark_listener(position, player)
@@ -88,18 +155,30 @@ class Game:
 		"""
 		if self.state == GameState.WAITING_FOR_O:
 			self.state = GameState.WAITING_FOR_X
-			self.player_x.move(self.board)
+			self.request_move(self.player_x)
 		else:
 			self.state = GameState.WAITING_FOR_O
-			self.player_o.move(self.board)
+			self.request_move(self.player_o)
 
 	def restart(self):
 		"""
-		Restarts the game
+		Restarts the game. Moves that players are computing for the old game are cancelled.
 		"""
-		self.board = Board(self.board_size, self.end_count)
+		self.player_x.cancel()
+		self.player_o.cancel()
+		self.board = self.board_class(self.board_size, self.end_count)
 		self.state = GameState.WAITING_FOR_X
-		self.player_x.move(self.board)
+		self.notify_start()
+		self.request_move(self.player_x)
+
+	def close(self) -> None:
+		"""
+		Ends the game for good. Moves that players are computing are cancelled and
+		players stop their worker processes and threads.
+		"""
+		self.state = GameState.END
+		self.player_x.close()
+		self.player_o.close()
 
 
 class GameState(Enum):
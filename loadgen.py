@@ -0,0 +1,155 @@
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import json
+import random
+import time
+
+
+class LoadClient:
+	"""
+	One connection to the game server that plays games with random moves against
+	AI opponents of the server. Messages of all its games are read by one task and
+	passed to the games by their ids.
+	"""
+	def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+		self.reader = reader
+		self.writer = writer
+		self.queues: Dict[int, asyncio.Queue] = {}
+		self.started: Dict[int, asyncio.Future] = {}
+		self.last_request = 0
+		# Seconds from sending client's move to receiving opponent's move
+		self.latencies: List[float] = []
+		self.games = 0
+		self.moves = 0
+
+	async def read_messages(self) -> None:
+		"""
+		Reads messages of the server and passes them to the games.
+		"""
+		while True:
+			line = await self.reader.readline()
+			if not line:
+				break
+			message = json.loads(line)
+			if message['type'] == 'started':
+				# Queue is created here because moves of the game may follow before the game reads them
+				self.queues[message['game']] = asyncio.Queue()
+				self.started.pop(message['request']).set_result(message['game'])
+			elif message['type'] == 'error':
+				raise RuntimeError(message['message'])
+			else:
+				self.queues[message['game']].put_nowait(message)
+
+	def send(self, message: dict) -> None:
+		self.writer.write(json.dumps(message).encode() + b'\n')
+
+	async def play_game(self, board_size: int, end_count: int, opponent: str, options: dict) -> None:
+		"""
+		Plays one game with random moves, the client plays X and O in turns of games.
+		:param board_size: Size of the board
+		:param end_count: Number of marks in a row necessary for winning
+		:param opponent: Type of the AI opponent
+		:param options: Options of the opponent
+		"""
+		self.last_request += 1
+		request = self.last_request
+		mark = 'X' if request % 2 == 1 else 'O'
+		started = asyncio.get_running_loop().create_future()
+		self.started[request] = started
+		self.send({'type': 'new', 'request': request, 'board_size': board_size, 'end_count': end_count,
+				   'mark': mark, 'opponent': opponent, 'options': options})
+		await self.writer.drain()
+		game_id = await started
+		queue = self.queues[game_id]
+
+		empty = [(x, y) for x in range(board_size) for y in range(board_size)]
+		random.shuffle(empty)
+		sent: Optional[float] = None
+		on_move = mark == 'X'
+		while True:
+			if on_move:
+				x, y = empty.pop()
+				self.send({'type': 'move', 'game': game_id, 'x': x, 'y': y})
+				await self.writer.drain()
+				sent = time.perf_counter()
+				self.moves += 1
+				on_move = False
+			message = await queue.get()
+			position = (message['x'], message['y'])
+			if message['mark'] != mark:
+				if sent is not None:
+					self.latencies.append(time.perf_counter() - sent)
+				empty.remove(position)
+				on_move = True
+			if message['type'] == 'end':
+				break
+		del self.queues[game_id]
+		self.games += 1
+
+
+async def run_load(host: str, port: int, connections: int, concurrency: int, games: int, board_size: int, end_count: int,
+				   opponent: str, options: dict) -> List[LoadClient]:
+	"""
+	Plays games on the server from `connections` connections with `concurrency` games at once on each.
+	:return: List of LoadClients with their statistics
+	"""
+	clients = []
+	for i in range(connections):
+		reader, writer = await asyncio.open_connection(host, port)
+		clients.append(LoadClient(reader, writer))
+	remaining = [games]
+
+	async def play_games(client: LoadClient) -> None:
+		while remaining[0] > 0:
+			remaining[0] -= 1
+			await client.play_game(board_size, end_count, opponent, options)
+
+	readers = [asyncio.create_task(client.read_messages()) for client in clients]
+	players = [play_games(client) for client in clients for i in range(concurrency)]
+	done, pending = await asyncio.wait([asyncio.gather(*players), *readers], return_when=asyncio.FIRST_COMPLETED)
+	for task in done:
+		task.result()
+	for client in clients:
+		client.writer.close()
+	for task in readers:
+		task.cancel()
+	return clients
+
+
+def get_percentile(values: List[float], percentile: float) -> float:
+	"""
+	:param values: Sorted list of values
+	:param percentile: Percentile from 0 to 100
+	:return: Value of the percentile (nearest rank)
+	"""
+	if len(values) == 0:
+		return 0.0
+	index = min(len(values) - 1, max(0, round(percentile / 100 * len(values)) - 1))
+	return values[index]
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Plays many games with random moves on the game server and measures its throughput.')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8765)
+	parser.add_argument('--connections', type=int, default=10)
+	parser.add_argument('--concurrency', type=int, default=10, help='Number of games played at once on every connection')
+	parser.add_argument('--games', type=int, default=1000)
+	parser.add_argument('--board-size', type=int, default=10)
+	parser.add_argument('--end-count', type=int, default=4)
+	parser.add_argument('--opponent', default='random', help='Type of the AI opponent')
+	parser.add_argument('--option', action='append', default=[], help='Option of the opponent as key=value')
+	args = parser.parse_args()
+
+	from tournament import parse_options
+	start = time.perf_counter()
+	clients = asyncio.run(run_load(args.host, args.port, args.connections, args.concurrency, args.games, args.board_size,
+								   args.end_count, args.opponent, parse_options(args.option)))
+	elapsed = time.perf_counter() - start
+	latencies = sorted(latency for client in clients for latency in client.latencies)
+	games = sum(client.games for client in clients)
+	moves = sum(client.moves for client in clients)
+	print(f'{games} games, {moves} client moves in {elapsed:.2f} s')
+	print(f'Games per second: {games/elapsed:.1f}, client moves per second: {moves/elapsed:.1f}')
+	print('Move latency: ' + ', '.join(f'p{p} {1000*get_percentile(latencies, p):.2f} ms' for p in [50, 90, 99, 99.9]))
@@ -1,7 +1,8 @@
 from game import Game
 from view import View
 from utils import Mark, Point
-from player import Player, RandomPlayer, HumanPlayer
+from player import Player, RandomPlayer, HumanPlayer, MiniMaxPlayer
+from records import GameRecorder, GameRecordWriter
 from typing import List
 import time
 
@@ -21,14 +22,26 @@ class ViewModel():
 		# Size of GUI window in pixels
 		window_size = 500
 
+		# File where finished games are appended (see records.py), None to not record them
+		record_path = None
+
 		self.view = View(window_size, board_size)
 		self.view.bind_tile_click_listener(self.on_tile_click)
 
 		self.px = HumanPlayer(end_count, Mark.X, '#32a852')
 		# self.px = RandomPlayer(end_count, Mark.X, '#32a852')
 		self.po = RandomPlayer(end_count, Mark.O, 'black')
+		# self.po = MiniMaxPlayer(end_count, Mark.O, 'black', max_depth=None, time_limit_ms=2000)
+
+		# AI players think in background and send their moves through tkinter mainloop
+		for player in [self.px, self.po]:
+			player.bind_move_scheduler(self.view.call_soon)
 
 		self.game = Game(self.px, self.po, end_count, board_size)
+		self.writer = None
+		if record_path is not None:
+			self.writer = GameRecordWriter(record_path)
+			GameRecorder(self.writer, self.game)
 		self.game.bind_draw_mark_listener(self.on_new_mark)
 		self.game.bind_end_game_listener(self.on_end_game)
 
@@ -47,6 +60,8 @@ class ViewModel():
 		:param player: Player that made the mark
 		"""
 		self.view.draw_mark(position, player.mark, player.color)
+		if player.last_stats is not None:
+			self.view.draw_info(player.last_stats.get_summary())
 
 	def on_end_game(self, positions: List[Point], player: Player):
 		"""
@@ -72,6 +87,9 @@ class ViewModel():
 		self.view.canvas.pack()
 		self.view.frame.pack()
 		self.view.root.mainloop()
+		self.game.close()
+		if self.writer is not None:
+			self.writer.close()
 
 if __name__ == '__main__':
 	vm = ViewModel()
@@ -0,0 +1,354 @@
+from board import Board
+from bitboard import BitBoardMasks, get_masks
+from minimax import SearchStats
+from utils import Point, Mark
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import math
+import random
+import time
+
+
+class MCTSNode:
+	"""
+	Node of the search tree. Node is created by a move of one player and its
+	wins are counted for that player (draw is half a win).
+	"""
+	__slots__ = ['move', 'parent', 'children', 'untried', 'visits', 'wins', 'winner']
+
+	def __init__(self, move: int, parent: Optional['MCTSNode']) -> None:
+		# Bit index of the move in BitBoardMasks, -1 for the root
+		self.move = move
+		self.parent = parent
+		self.children: List[MCTSNode] = []
+		# Moves that are not expanded yet, None until the node is expanded for the first time
+		self.untried: Optional[List[int]] = None
+		self.visits = 0
+		self.wins = 0.0
+		# 1 or -1 when the move ended the game by win of X or O, 0 for draw, None otherwise
+		self.winner: Optional[int] = None
+
+	def get_child(self, move: int) -> Optional['MCTSNode']:
+		for child in self.children:
+			if child.move == move:
+				return child
+		return None
+
+
+class MCTS:
+	"""
+	Monte Carlo Tree Search with UCT selection. Positions are stored as two bitmasks
+	(see BitBoard) so moves in the tree and in playouts are just ORs of bits and win
+	is checked with shifts of the line through the last move. Playouts place marks
+	on randomly shuffled empty tiles until somebody wins or the board is full.
+	Moves in the tree are limited to empty tiles at most `candidate_radius` from placed marks.
+	"""
+	def __init__(self, size: int, end_count: int, exploration: float = 1.4, candidate_radius: int = 1, seed: Optional[int] = None) -> None:
+		self.size = size
+		self.end_count = end_count
+		self.masks: BitBoardMasks = get_masks(size, end_count)
+		self.exploration = exploration
+		self.candidate_radius = candidate_radius
+		self.rng = random.Random(seed)
+		self.root = MCTSNode(-1, None)
+		self.x_bits = 0
+		self.o_bits = 0
+		self.x_to_move = True
+		self.playouts = 0
+		# Set from other thread by stop() to end the search
+		self.stopped = False
+
+	def set_position(self, x_bits: int, o_bits: int, x_to_move: bool) -> None:
+		"""
+		Sets position of the root. The tree is kept when the position is reached from the root
+		by moves that are in the tree, otherwise the search starts with new tree.
+		:param x_bits: Bitmask with marks of X
+		:param o_bits: Bitmask with marks of O
+		:param x_to_move: True if X is on move
+		"""
+		node = self.root
+		new_x = x_bits & ~self.x_bits
+		new_o = o_bits & ~self.o_bits
+		if x_bits & self.x_bits == self.x_bits and o_bits & self.o_bits == self.o_bits and bin(new_x | new_o).count('1') <= 2:
+			x_turn = self.x_to_move
+			while node is not None and (new_x or new_o):
+				bits = new_x if x_turn else new_o
+				if bits == 0 or bits & (bits - 1):
+					node = None
+					break
+				node = node.get_child(bits.bit_length() - 1)
+				if x_turn:
+					new_x = 0
+				else:
+					new_o = 0
+				x_turn = not x_turn
+		else:
+			node = None
+
+		if node is None or node.winner is not None:
+			node = MCTSNode(-1, None)
+		node.parent = None
+		self.root = node
+		self.stopped = False
+		self.x_bits = x_bits
+		self.o_bits = o_bits
+		self.x_to_move = x_to_move
+
+	def set_board(self, board: Board, mark: Mark) -> None:
+		"""
+		Sets position of the root from the board.
+		:param board: Board with the position
+		:param mark: Mark of the player on move
+		"""
+		x_bits = 0
+		o_bits = 0
+		stride = self.masks.stride
+		for position in board.move_stack:
+			tile = board.get_tile(position.x, position.y)
+			if tile == 1:
+				x_bits |= 1 << (position.x*stride + position.y)
+			elif tile == -1:
+				o_bits |= 1 << (position.x*stride + position.y)
+		self.set_position(x_bits, o_bits, mark == Mark.X)
+
+	def search(self, playouts: Optional[int] = None, time_limit_ms: Optional[float] = None) -> None:
+		"""
+		Runs playouts from the root until the number of playouts or the time limit is reached.
+		:param playouts: Number of playouts, None for no limit
+		:param time_limit_ms: Time limit in milliseconds, None for no limit
+		"""
+		deadline = None if time_limit_ms is None else time.monotonic() + time_limit_ms / 1000
+		count = 0
+		while not self.stopped and (playouts is None or count < playouts):
+			if deadline is not None and count % 16 == 0 and time.monotonic() > deadline:
+				break
+			self.run_playout()
+			count += 1
+		self.playouts += count
+
+	def run_playout(self) -> None:
+		"""
+		Selects a leaf by UCT, expands it by one move, plays random game from it
+		and adds the result to all nodes on the path.
+		"""
+		node = self.root
+		x_bits = self.x_bits
+		o_bits = self.o_bits
+		x_to_move = self.x_to_move
+
+		# Selection
+		while node.winner is None and node.untried is not None and len(node.untried) == 0 and node.children:
+			node = self.select_child(node)
+			if x_to_move:
+				x_bits |= 1 << node.move
+			else:
+				o_bits |= 1 << node.move
+			x_to_move = not x_to_move
+
+		# Expansion
+		winner = node.winner
+		if winner is None:
+			if node.untried is None:
+				node.untried = self.get_candidates(x_bits | o_bits)
+				self.rng.shuffle(node.untried)
+			if node.untried:
+				move = node.untried.pop()
+				child = MCTSNode(move, node)
+				node.children.append(child)
+				node = child
+				if x_to_move:
+					x_bits |= 1 << move
+					if self.is_win(x_bits, move):
+						child.winner = 1
+				else:
+					o_bits |= 1 << move
+					if self.is_win(o_bits, move):
+						child.winner = -1
+				if child.winner is None and (x_bits | o_bits) == self.masks.board_mask:
+					child.winner = 0
+				x_to_move = not x_to_move
+				winner = child.winner
+				if winner:
+					# Winning move is always played, other moves of the node are not searched
+					node.parent.children = [child]
+					node.parent.untried = []
+			else:
+				# No empty tile left
+				node.winner = 0
+				winner = 0
+			if winner is None:
+				winner = self.playout(x_bits, o_bits, x_to_move)
+
+		# Backpropagation, wins are counted for the player that made the move into the node
+		x_moved = not x_to_move
+		while node is not None:
+			node.visits += 1
+			if winner == 0:
+				node.wins += 0.5
+			elif (winner == 1) == x_moved:
+				node.wins += 1
+			x_moved = not x_moved
+			node = node.parent
+
+	def select_child(self, node: MCTSNode) -> MCTSNode:
+		"""
+		:return: Child with the best UCT value
+		"""
+		log_visits = math.log(node.visits)
+		c = self.exploration
+		best = None
+		best_value = -math.inf
+		for child in node.children:
+			value = child.wins / child.visits + c * math.sqrt(log_visits / child.visits)
+			if value > best_value:
+				best_value = value
+				best = child
+		return best
+
+	def playout(self, x_bits: int, o_bits: int, x_to_move: bool) -> int:
+		"""
+		Plays random moves until the end of the game.
+		:return: 1 for win of X, -1 for win of O and 0 for draw
+		"""
+		empty = self.get_indexes(self.masks.board_mask & ~(x_bits | o_bits))
+		self.rng.shuffle(empty)
+		for index in empty:
+			if x_to_move:
+				x_bits |= 1 << index
+				if self.is_win(x_bits, index):
+					return 1
+			else:
+				o_bits |= 1 << index
+				if self.is_win(o_bits, index):
+					return -1
+			x_to_move = not x_to_move
+		return 0
+
+	def is_win(self, bits: int, index: int) -> bool:
+		"""
+		Checks if the mark on bit index is part of `end_count` marks in a row.
+		:param bits: Bitmask with marks of the player
+		:param index: Bit index of the last mark
+		:return: True if the player wins
+		"""
+		line_masks = self.masks.line_masks
+		shifts = self.masks.shifts
+		for d in range(4):
+			line = bits & line_masks[d][index]
+			shift = shifts[d]
+			run = line
+			for i in range(1, self.end_count):
+				run &= line >> (i*shift)
+				if not run:
+					break
+			if run:
+				return True
+		return False
+
+	def get_candidates(self, occupied: int) -> List[int]:
+		"""
+		:param occupied: Bitmask with all marks
+		:return: List of bit indexes of empty tiles at most `candidate_radius` from marks, center of empty board
+		"""
+		if occupied == 0:
+			center = self.size // 2
+			return [center*self.masks.stride + center]
+		near = occupied
+		for i in range(self.candidate_radius):
+			grown = near
+			for shift in self.masks.shifts:
+				grown |= near << shift | near >> shift
+			# Bits shifted to the padding column would wrap to the next row in the next step
+			near = grown & self.masks.board_mask
+		return self.get_indexes(near & self.masks.board_mask & ~occupied)
+
+	def get_indexes(self, bits: int) -> List[int]:
+		"""
+		:return: List of indexes of set bits
+		"""
+		indexes = []
+		while bits:
+			low = bits & -bits
+			indexes.append(low.bit_length() - 1)
+			bits ^= low
+		return indexes
+
+	def get_root_statistics(self) -> Dict[int, Tuple[int, float]]:
+		"""
+		:return: Dictionary from bit index of every root move to its visits and wins
+		"""
+		return {child.move: (child.visits, child.wins) for child in self.root.children}
+
+	def get_principal_variation(self) -> List[Point]:
+		"""
+		:return: List of Points following the most visited children from the root
+		"""
+		variation = []
+		node = self.root
+		while node.children:
+			node = max(node.children, key=lambda child: child.visits)
+			variation.append(self.masks.points[node.move])
+		return variation
+
+	def get_depth(self) -> int:
+		"""
+		:return: Depth of the principal variation
+		"""
+		depth = 0
+		node = self.root
+		while node.children:
+			node = max(node.children, key=lambda child: child.visits)
+			depth += 1
+		return depth
+
+	def stop(self) -> None:
+		"""
+		Stops running search from other thread.
+		"""
+		self.stopped = True
+
+
+def _search_worker(size: int, end_count: int, x_bits: int, o_bits: int, x_to_move: bool, exploration: float,
+				   candidate_radius: int, playouts: Optional[int], time_limit_ms: Optional[float], seed: int):
+	"""
+	Searches the position with new tree in worker process (root parallelism).
+	:return: Tuple of root statistics (see MCTS.get_root_statistics()) and number of playouts
+	"""
+	mcts = MCTS(size, end_count, exploration, candidate_radius, seed)
+	mcts.set_position(x_bits, o_bits, x_to_move)
+	mcts.search(playouts, time_limit_ms)
+	return mcts.get_root_statistics(), mcts.playouts
+
+
+def search_parallel(mcts: MCTS, executor: Optional[ProcessPoolExecutor], workers: int, playouts: Optional[int], time_limit_ms: Optional[float]) -> Tuple[int, SearchStats]:
+	"""
+	Searches the root of the tree in this process and in `workers` - 1 other processes
+	with independent trees. Visits of root moves of all trees are summed.
+	:param mcts: MCTS with the position, its tree is kept
+	:param executor: Pool of worker processes, None for `workers` = 1
+	:param workers: Number of trees
+	:param playouts: Number of playouts of each tree
+	:param time_limit_ms: Time limit of the search
+	:return: Tuple of bit index of the most visited move and SearchStats
+	"""
+	start = time.monotonic()
+	futures = [executor.submit(_search_worker, mcts.size, mcts.end_count, mcts.x_bits, mcts.o_bits, mcts.x_to_move,
+							   mcts.exploration, mcts.candidate_radius, playouts, time_limit_ms, mcts.rng.getrandbits(32))
+			   for i in range(workers - 1)]
+	playouts_before = mcts.playouts
+	mcts.search(playouts, time_limit_ms)
+	visits = {move: v for move, (v, w) in mcts.get_root_statistics().items()}
+	stats = SearchStats()
+	stats.nodes = mcts.playouts - playouts_before
+	for future in futures:
+		statistics, count = future.result()
+		stats.nodes += count
+		for move, (v, w) in statistics.items():
+			visits[move] = visits.get(move, 0) + v
+	stats.time = time.monotonic() - start
+	stats.depth = mcts.get_depth()
+	stats.principal_variation = mcts.get_principal_variation()
+	if len(visits) == 0:
+		# Search was stopped before the first playout
+		return mcts.get_candidates(mcts.x_bits | mcts.o_bits)[0], stats
+	return max(visits, key=visits.get), stats
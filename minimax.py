@@ -1,6 +1,99 @@
+from board import Board
+from evaluation import Evaluator, WIN_SCORE, WIN_THRESHOLD
+from solved import SolvedPositions
 from utils import Point, Mark
-from typing import List, Callable, Optional
+from typing import Dict, List, Callable, Iterator, Optional, Tuple
+from enum import Enum
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
 import math
+import time
+
+
+class Bound(Enum):
+	"""
+	Represents type of value stored in transposition table.
+	"""
+	EXACT = 0
+	LOWER = 1
+	UPPER = 2
+
+
+class TranspositionEntry():
+	"""
+	Result of search of one position stored in transposition table. Value and bound
+	are from perspective of the player on move in the position, so searches of both
+	players can share one table.
+	"""
+	__slots__ = ['key', 'value', 'depth', 'bound', 'best_move', 'generation']
+
+	def __init__(self, key: int, value: float, depth: int, bound: Bound, best_move: Optional[Point], generation: int) -> None:
+		self.key = key
+		self.value = value
+		self.depth = depth
+		self.bound = bound
+		self.best_move = best_move
+		self.generation = generation
+
+
+class TranspositionTable():
+	"""
+	Fixed size hash table of searched positions indexed by Zobrist key of the board.
+	Number of slots is derived from memory cap. When two positions share the slot
+	the entry from older search or with lower depth is replaced.
+	"""
+	# Estimated memory of one stored entry including the slot in the list
+	ENTRY_SIZE = 112
+
+	def __init__(self, max_size_mb: int = 64) -> None:
+		self.slot_count = max(1, max_size_mb * 1024 * 1024 // self.ENTRY_SIZE)
+		self.slots: List[Optional[TranspositionEntry]] = [None] * self.slot_count
+		self.generation = 0
+
+	def new_search(self) -> None:
+		"""
+		Marks all stored entries as old so they are replaced first.
+		"""
+		self.generation += 1
+
+	def clear(self) -> None:
+		"""
+		Removes all stored entries.
+		"""
+		self.slots = [None] * self.slot_count
+		self.generation = 0
+
+	def get(self, key: int) -> Optional[TranspositionEntry]:
+		"""
+		Finds entry for given position.
+		:param key: Zobrist key of the position
+		:return: Stored entry or None if the position is not in the table
+		"""
+		entry = self.slots[key % self.slot_count]
+		if entry is not None and entry.key == key:
+			return entry
+		return None
+
+	def store(self, key: int, value: float, depth: int, bound: Bound, best_move: Optional[Point]) -> None:
+		"""
+		Stores search result of the position if the replacement policy allows it.
+		:param key: Zobrist key of the position
+		:param value: Value of the position
+		:param depth: Depth of the search below the position
+		:param bound: Type of the value
+		:param best_move: Best move found in the position
+		"""
+		index = key % self.slot_count
+		entry = self.slots[index]
+		if entry is None or entry.key == key or entry.generation != self.generation or depth >= entry.depth:
+			self.slots[index] = TranspositionEntry(key, value, depth, bound, best_move, self.generation)
+
+class SearchTimeout(Exception):
+	"""
+	Raised inside of the search when the time budget is exhausted or the search is stopped.
+	"""
+	pass
+
 
 class MiniMaxMove():
 	def __init__(self, position):
@@ -9,6 +102,8 @@ class MiniMaxMove():
 		self.end_lose = 0
 		self.end_draw = 0
 		self.value = -99999
+		# False when the value is only upper bound because the move was cut off
+		self.is_exact = True
 
 	def add_result(self, result):
 		if result == 1:
@@ -20,110 +115,668 @@ class MiniMaxMove():
 
 	def get_score(self):
 		return self.end_win - self.end_lose
-		# return self.value
 
 	def __repr__(self):
 		return f'{self.position} - W:{self.end_win}, L:{self.end_lose}, D:{self.end_draw}'
 
+class SearchStats():
+	"""
+	Statistics of one MiniMax search. Nodes, time, completed depths and principal
+	variation are always collected. Counters that cost time in every node - leaf
+	evaluations, cutoffs per ply, transposition table hits and time per root
+	move - are collected only when `detailed` is True.
+	"""
+	def __init__(self, detailed: bool = False) -> None:
+		self.detailed = detailed
+		self.nodes = 0
+		self.time = 0.0
+		self.depth = 0
+		# Seconds from start of the search and number of nodes when each depth was completed
+		self.depth_times: List[float] = []
+		self.depth_nodes: List[int] = []
+		self.principal_variation: List[Point] = []
+		self.leaf_evaluations = 0
+		# Number of cutoffs in maximizing (beta) and minimizing (alpha) nodes by ply from root
+		self.beta_cutoffs: Dict[int, int] = {}
+		self.alpha_cutoffs: Dict[int, int] = {}
+		self.table_probes = 0
+		self.table_hits = 0
+		self.root_move_times: Dict[Point, float] = {}
+
+	def merge(self, other: 'SearchStats') -> None:
+		"""
+		Adds counters of search of root moves made in another process.
+		:param other: SearchStats of the other search
+		"""
+		self.nodes += other.nodes
+		self.leaf_evaluations += other.leaf_evaluations
+		for ply, count in other.beta_cutoffs.items():
+			self.beta_cutoffs[ply] = self.beta_cutoffs.get(ply, 0) + count
+		for ply, count in other.alpha_cutoffs.items():
+			self.alpha_cutoffs[ply] = self.alpha_cutoffs.get(ply, 0) + count
+		self.table_probes += other.table_probes
+		self.table_hits += other.table_hits
+		for position, seconds in other.root_move_times.items():
+			self.root_move_times[position] = self.root_move_times.get(position, 0.0) + seconds
+
+	def get_nodes_per_second(self) -> float:
+		if self.time == 0:
+			return 0.0
+		return self.nodes / self.time
+
+	def get_branching_factor(self) -> float:
+		"""
+		Effective branching factor - ratio of nodes of the last two iterations
+		of iterative deepening, or depth-th root of all nodes for single iteration.
+		:return: Effective branching factor
+		"""
+		if len(self.depth_nodes) >= 3:
+			previous = self.depth_nodes[-2] - self.depth_nodes[-3]
+			if previous > 0:
+				return (self.depth_nodes[-1] - self.depth_nodes[-2]) / previous
+		if len(self.depth_nodes) == 2 and self.depth_nodes[0] > 0:
+			return (self.depth_nodes[1] - self.depth_nodes[0]) / self.depth_nodes[0]
+		if self.depth > 0 and self.nodes > 0:
+			return self.nodes ** (1 / self.depth)
+		return 0.0
+
+	def get_summary(self) -> str:
+		"""
+		:return: One line summary of the search
+		"""
+		return f'depth {self.depth}, {self.nodes} nodes in {self.time:.2f} s ({self.get_nodes_per_second():.0f} nodes/s), PV {self.principal_variation}'
+
+	def __repr__(self):
+		s = self.get_summary() + '\n'
+		s += f'Effective branching factor: {self.get_branching_factor():.2f}\n'
+		s += f'Time to depth: {", ".join(f"{t:.3f}" for t in self.depth_times)}\n'
+		if self.detailed:
+			s += f'Leaf evaluations: {self.leaf_evaluations}\n'
+			s += f'Transposition table hits: {self.table_hits} of {self.table_probes} probes\n'
+			s += f'Beta cutoffs by ply: {dict(sorted(self.beta_cutoffs.items()))}\n'
+			s += f'Alpha cutoffs by ply: {dict(sorted(self.alpha_cutoffs.items()))}\n'
+			s += f'Time by root move: {self.root_move_times}\n'
+		return s
+
+
+class SearchPool():
+	"""
+	Pool of worker processes searching root moves of MiniMax in parallel.
+	Workers share the best root value found so far (alpha) so moves that
+	cannot be better are cut off early. Every worker keeps its own
+	transposition table of `table_size_mb` between searches.
+	"""
+	def __init__(self, workers: int, table_size_mb: int = 64) -> None:
+		self.workers = workers
+		self.alpha = multiprocessing.RawValue('d', -math.inf)
+		self.executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(self.alpha, table_size_mb))
+
+	def close(self) -> None:
+		"""
+		Stops all worker processes.
+		"""
+		self.executor.shutdown()
+
+
+_worker_alpha = None
+_worker_table = None
+
+
+def _init_worker(alpha, table_size_mb: int) -> None:
+	"""
+	Initializes worker process of SearchPool.
+	:param alpha: Shared best value of root moves
+	:param table_size_mb: Memory cap of worker's transposition table
+	"""
+	global _worker_alpha, _worker_table
+	_worker_alpha = alpha
+	_worker_table = TranspositionTable(table_size_mb)
+
+
+def _search_root_move(board: Board, mark: Mark, position: Point, depth: int, deadline: Optional[float], detailed: bool):
+	"""
+	Searches one root move in worker process of SearchPool.
+	:return: Tuple of searched MiniMaxMove (None if time run out), SearchStats and depth used
+	"""
+	mm = MiniMax(board, mark, depth, _worker_table, collect_stats=detailed)
+	mm.evaluator = Evaluator(board)
+	mm.deadline = deadline
+	mm.shared_alpha = _worker_alpha
+	mm.root_ply = len(board.move_stack)
+	try:
+		move, move_depth = mm.search_move(board, position, depth, _worker_alpha.value)
+	except SearchTimeout:
+		return None, mm.stats, 0
+	return move, mm.stats, move_depth
+
+
 class MiniMax():
-	def __init__(self, board, mark, max_depth):
+	def __init__(self, board, mark, max_depth, table: Optional[TranspositionTable] = None, time_limit_ms: Optional[int] = None, pool: Optional[SearchPool] = None, candidate_radius: Optional[int] = None, move_ordering: bool = True, collect_stats: bool = False, solved: Optional[SolvedPositions] = None, root_moves: Optional[List[Point]] = None):
 		self.board = board
 		self.mark = mark
+		self.opponent_mark = Mark.X if mark == Mark.O else Mark.O
 		self.moves = []
 		self.max_depth = max_depth
+		if table is None:
+			table = TranspositionTable()
+		self.table = table
+		self.time_limit_ms = time_limit_ms
+		self.pool = pool
+		# Radius of candidate tiles searched, None keeps the radius of the board
+		self.candidate_radius = candidate_radius
+		self.deadline = None
+		# Set from other thread by stop() to end the search as soon as possible
+		self.stopped = False
+		# Best root value shared between processes, it is used as a lower bound in every node
+		self.shared_alpha = None
+		self.evaluator = None
+		# Move ordering - threats first, then best move from transposition table,
+		# killer moves and moves with good history
+		self.move_ordering = move_ordering
+		# Two last moves that caused cutoff for each number of marks on board
+		self.killers: Dict[int, List[Point]] = {}
+		# Sum of squared depths of cutoffs caused by each move of each player
+		self.history = {Mark.X: [0] * (board.size*board.size), Mark.O: [0] * (board.size*board.size)}
+		self.completed_depth = 0
+		self.stats = SearchStats(collect_stats)
+		# Stats object that is None when detailed stats are not collected so checks in nodes are cheap
+		self.detailed_stats = self.stats if collect_stats else None
+		# Number of marks on the board in the root of the search
+		self.root_ply = 0
+		# Database of proven results. It is read only in nodes at most `solved_plies` from the root
+		# (every position once per search) and written in nodes at least `solved_depth` from leaves.
+		self.solved = solved
+		self.solved_plies = 2
+		self.solved_depth = 2
+		self.solved_probes: Dict[int, Optional[Tuple[int, int]]] = {}
+		# Number of values returned from transposition table. Their wins may come from other
+		# depths, so nodes whose subtree used any of them do not store distances to SolvedPositions.
+		self.table_values = 0
+		# Moves searched in the root, None for all candidate tiles
+		self.root_moves = root_moves
+
+	def compute(self) -> SearchStats:
+		"""
+		Computes values of all candidate moves. Without time limit the search
+		goes directly to `max_depth`. With time limit the search is iteratively
+		deepened and moves from the last fully searched depth are kept.
+		:return: SearchStats of the search
+		"""
+		board = self.create_search_board()
+		self.table.new_search()
+		self.root_ply = len(board.move_stack)
+		self.solved_probes = {}
+		max_depth = self.max_depth
+		if max_depth is None:
+			max_depth = board.empty_count
+
+		start = time.monotonic()
+		if self.time_limit_ms is None:
+			self.deadline = None
+			try:
+				self.search_root(board, max_depth, self.moves)
+				self.completed_depth = max_depth
+				self.stats.depth_times.append(time.monotonic() - start)
+				self.stats.depth_nodes.append(self.stats.nodes)
+			except SearchTimeout:
+				pass
+		else:
+			self.deadline = start + self.time_limit_ms / 1000
+			depth = 1
+			while depth <= max_depth:
+				moves = []
+				try:
+					deepest = self.search_root(board, depth, moves)
+				except SearchTimeout:
+					# Moves searched to the end in the first iteration are better than nothing,
+					# they are the first moves of move ordering
+					if len(self.moves) == 0:
+						self.moves = moves if len(moves) > 0 else self.get_fallback_moves()
+					break
+				self.moves = moves
+				self.completed_depth = depth
+				self.stats.depth_times.append(time.monotonic() - start)
+				self.stats.depth_nodes.append(self.stats.nodes)
+				# Stop when the win is found or deeper search would search the same tree
+				if len(moves) == 0 or max(move.value for move in moves) >= WIN_THRESHOLD or deepest < depth:
+					break
+				depth += 1
+
+		if self.solved is not None:
+			self.solved.flush()
+		self.stats.time = time.monotonic() - start
+		self.stats.depth = self.completed_depth
+		self.stats.principal_variation = self.get_principal_variation()
+		return self.stats
+
+	def stop(self) -> None:
+		"""
+		Stops running compute() from other thread. The search ends in the next
+		node, moves searched so far are kept.
+		"""
+		self.stopped = True
+		if self.pool is not None:
+			# Workers cut off all remaining moves when no value can exceed alpha
+			self.pool.alpha.value = math.inf
+
+	def get_principal_variation(self) -> List[Point]:
+		"""
+		Follows best moves stored in transposition table from the best root move.
+		:return: List of Points with expected moves of both players
+		"""
+		best_move = self.get_best_move()
+		if best_move is None:
+			return []
+		board = self.board.snapshot()
+		variation = []
+		mark = self.mark
+		position = best_move
+		while position is not None and board.is_valid_move(position) and len(variation) <= self.completed_depth:
+			variation.append(position)
+			board.set_move(position, mark)
+			if board.check_end() is not None:
+				break
+			mark = Mark.X if mark == Mark.O else Mark.O
+			key, symmetry = board.get_canonical_key()
+			entry = self.table.get(key)
+			position = None
+			if entry is not None and entry.best_move is not None:
+				position = board.from_canonical(entry.best_move, symmetry)
+		return variation
+
+	def search_root(self, board: Board, depth: int, moves: List[MiniMaxMove]) -> int:
+		"""
+		Searches all candidate moves to given depth. Moves are searched in order of
+		their values from previous search so the best move is searched first.
+		Moves leading to symmetric positions are searched only once.
+		With SearchPool the first move is searched here and the rest in parallel.
+		:param board: Board to search, it is the same after the call
+		:param depth: Maximal depth of the search
+		:param moves: List where MiniMaxMove is added after each move is searched
+		:return: Largest depth used for any of the moves
+		"""
+		candidates = self.get_distinct_moves(board, self.get_root_candidates(board))
+		if self.pool is not None and len(candidates) > 1:
+			return self.search_root_parallel(board, depth, moves, candidates)
 
-	def compute(self):
-		candidates = self.board.get_candidate_tiles()
+		# Moves that cannot be better than the best move so far are cut off like in search_root_parallel()
+		deepest = 0
+		alpha = -math.inf
 		for p in candidates:
-			if self.board.tiles[p.x][p.y] == 0:
-				child = self.board.copy()
-				child.set_move(p, self.mark) 
-				move = MiniMaxMove(p)
-				depth = min(len(child.get_candidate_tiles()), self.max_depth)
-				v = self.minimax(child, depth, False, move, -math.inf, math.inf)
-				move.value = v
-				self.moves.append(move)
-				print(f'Done move {len(self.moves)} from {len(candidates)}')
-				print(move, move.get_score())
-				print(v)
-				print('--------')
+			move, move_depth = self.search_move(board, p, depth, alpha)
+			deepest = max(deepest, move_depth)
+			moves.append(move)
+			alpha = max(alpha, move.value)
+		return deepest
+
+	def get_root_candidates(self, board: Board) -> List[Point]:
+		"""
+		Orders root moves by their values from previous search, moves with equal values
+		(and all moves in the first search) by move ordering of get_child_moves().
+		:param board: Board to search
+		:return: List of Points with root moves
+		"""
+		candidates = board.get_candidate_tiles() if self.root_moves is None else list(self.root_moves)
+		previous = {move.position: (move.value, move.get_score()) for move in self.moves}
+		order = {position: i for i, position in enumerate(self.get_child_moves(board, 2, self.mark))}
+		candidates.sort(key=lambda p: (previous.get(p, (-math.inf, -math.inf)), -order.get(p, len(order))), reverse=True)
+		return candidates
+
+	def create_search_board(self) -> Board:
+		"""
+		Search is done on one private board by making and undoing moves.
+		Creates the board and its evaluator.
+		:return: Snapshot of the board with candidate radius of the search
+		"""
+		board = self.board.snapshot()
+		if self.candidate_radius is not None:
+			board.set_candidate_radius(self.candidate_radius)
+		self.evaluator = Evaluator(board)
+		return board
+
+	def get_fallback_moves(self) -> List[MiniMaxMove]:
+		"""
+		Creates move when no root move was searched before the time run out - the first
+		root move of move ordering valued by static evaluation.
+		:return: List with one MiniMaxMove or empty list when there is no move
+		"""
+		# Interrupted search leaves its moves on the searched board
+		board = self.create_search_board()
+		candidates = self.get_root_candidates(board)
+		if len(candidates) == 0:
+			return []
+		move = MiniMaxMove(candidates[0])
+		self.make_move(board, move.position, self.mark)
+		move.value = self.evaluator.get_score(self.mark)
+		self.undo_move(board)
+		move.is_exact = False
+		return [move]
+
+	def get_distinct_moves(self, board: Board, candidates: List[Point]) -> List[Point]:
+		"""
+		Removes moves that lead to positions symmetric to position after some previous move.
+		On symmetric boards (e.g. with one mark in the center) this leaves up to 8 times less moves.
+		:param board: Board to search, it is the same after the call
+		:param candidates: List of Points with moves
+		:return: List of Points with the first move of each group of symmetric moves
+		"""
+		keys = set()
+		distinct = []
+		for position in candidates:
+			board.set_move(position, self.mark)
+			key = board.get_canonical_key()[0]
+			board.undo_move()
+			if key not in keys:
+				keys.add(key)
+				distinct.append(position)
+		return distinct
+
+	def search_root_parallel(self, board: Board, depth: int, moves: List[MiniMaxMove], candidates: List[Point]) -> int:
+		"""
+		Searches the first candidate move to get lower bound of the best value and then
+		distributes the rest of the moves to SearchPool (Young Brothers Wait).
+		:param board: Board to search, it is the same after the call
+		:param depth: Maximal depth of the search
+		:param moves: List where MiniMaxMove is added after each move is searched
+		:param candidates: Ordered list of root moves
+		:return: Largest depth used for any of the moves
+		"""
+		alpha = self.pool.alpha
+		alpha.value = -math.inf
+		move, deepest = self.search_move(board, candidates[0], depth, -math.inf)
+		moves.append(move)
+		alpha.value = move.value
+		if self.stopped:
+			raise SearchTimeout()
+
+		detailed = self.detailed_stats is not None
+		futures = [self.pool.executor.submit(_search_root_move, board, self.mark, p, depth, self.deadline, detailed) for p in candidates[1:]]
+		timed_out = False
+		for future in as_completed(futures):
+			move, stats, move_depth = future.result()
+			self.stats.merge(stats)
+			if move is None:
+				timed_out = True
+				continue
+			deepest = max(deepest, move_depth)
+			moves.append(move)
+			if move.value > alpha.value:
+				alpha.value = move.value
+
+		if timed_out or self.stopped:
+			raise SearchTimeout()
+		return deepest
+
+	def search_move(self, board: Board, position: Point, depth: int, alpha: float):
+		"""
+		Searches one root move. Moves that are not better than `alpha` are
+		cut off and their value is only upper bound.
+		:param board: Board to search, it is the same after the call
+		:param position: Point with the root move
+		:param depth: Maximal depth of the search
+		:param alpha: Value the move has to exceed to be searched exactly
+		:return: Tuple of searched MiniMaxMove and depth used for the move
+		"""
+		start = time.perf_counter()
+		self.make_move(board, position, self.mark)
+		move = MiniMaxMove(position)
+		move_depth = min(len(board.candidates), depth)
+		move.value = self.minimax(board, move_depth, False, move, alpha, math.inf)
+		self.undo_move(board)
+		if self.shared_alpha is not None:
+			alpha = max(alpha, self.shared_alpha.value)
+		move.is_exact = move.value > alpha
+		if self.detailed_stats is not None:
+			times = self.detailed_stats.root_move_times
+			times[position] = times.get(position, 0.0) + time.perf_counter() - start
+		return move, move_depth
+
+	def make_move(self, board: Board, position: Point, mark: Mark) -> None:
+		"""
+		Makes the move on searched board and updates static evaluation.
+		:param board: Currently searched board
+		:param position: Point with position of the move
+		:param mark: Mark of the player making the move
+		"""
+		board.set_move(position, mark)
+		self.evaluator.on_move(board, position)
+
+	def undo_move(self, board: Board) -> None:
+		"""
+		Takes back the last move on searched board and updates static evaluation.
+		:param board: Currently searched board
+		"""
+		self.evaluator.on_undo(board, board.last_move)
+		board.undo_move()
 
 	def get_best_move(self):
-		best_score = -math.inf
+		# Minimax value decides, exact values and number of won and lost end games break ties
+		best_score = (-math.inf, False, -math.inf)
 		best_move = None
-		total_moves = 0
 		for move in self.moves:
-			total_moves += move.end_win + move.end_lose + move.end_draw
-			if move.get_score() > best_score:
-				best_score = move.get_score()
+			score = (move.value, move.is_exact, move.get_score())
+			if score > best_score:
+				best_score = score
 				best_move = move.position
 
 		return best_move
 
 
-	def minimax(self, node: List[Point], depth: int, is_maximizing: bool, move: MiniMaxMove, alpha: int, beta: int) -> int:
+	def minimax(self, board: Board, depth: int, is_maximizing: bool, move: MiniMaxMove, alpha: int, beta: int) -> int:
 		"""
 		MiniMax algorithm search through all possible game states and finds the 
-		best for the player.
-		:param node: Currently serached board
+		best for the player. Moves are made on the board and taken back before return
+		so the board is the same after the call.
+		:param board: Currently serached board
 		:param depth: Number of empty tiles - 1
 		:param is_maximizing: True if currently serach move is 
 							  maximizin (is played by this player), False otherwise
-		:return: Value of currently serached node
+		:return: Value of currently serached node. Wins and losses are worth around
+				 WIN_SCORE (more for faster ones), other leaves get static evaluation.
 		"""
-		winner = self.get_board_result(node)
+		stats = self.detailed_stats
+		self.stats.nodes += 1
+		# Reading the clock costs much less than one node, so the deadline is kept to a node
+		if self.stopped or self.deadline is not None and time.monotonic() > self.deadline:
+			raise SearchTimeout()
+		if self.shared_alpha is not None:
+			alpha = max(alpha, self.shared_alpha.value)
+
+		winner = self.get_board_result(board)
 		if depth == 0 or winner is not None:
 			move.add_result(winner)
 			if winner is None:
-				return 0
-			return winner
+				if stats is not None:
+					stats.leaf_evaluations += 1
+				return self.evaluator.get_score(self.mark)
+			return winner * (WIN_SCORE + depth)
 
+		# Symmetric positions share one entry, best move is stored in the canonical position
+		key, symmetry = board.get_canonical_key()
+		if self.solved is not None and len(board.move_stack) - self.root_ply <= self.solved_plies:
+			if key not in self.solved_probes:
+				self.solved_probes[key] = self.solved.get(key, board.size, board.end_count, board.candidate_radius)
+			solved = self.solved_probes[key]
+			if solved is not None:
+				return self.get_solved_value(solved, depth)
+
+		entry = self.table.get(key)
+		best_move = None
+		if stats is not None:
+			stats.table_probes += 1
+			if entry is not None:
+				stats.table_hits += 1
+		if entry is not None:
+			if entry.best_move is not None:
+				best_move = board.from_canonical(entry.best_move, symmetry)
+			if entry.depth >= depth:
+				# Stored value is from perspective of the player on move, lower bound of the
+				# opponent is upper bound of this player
+				entry_value = entry.value if is_maximizing else -entry.value
+				entry_bound = entry.bound
+				if not is_maximizing and entry_bound != Bound.EXACT:
+					entry_bound = Bound.UPPER if entry_bound == Bound.LOWER else Bound.LOWER
+				if entry_bound == Bound.EXACT:
+					self.table_values += 1
+					return entry_value
+				elif entry_bound == Bound.LOWER:
+					alpha = max(alpha, entry_value)
+				else:
+					beta = min(beta, entry_value)
+				if beta <= alpha:
+					self.table_values += 1
+					return entry_value
+
+		table_values = self.table_values
+		alpha_start = alpha
+		beta_start = beta
 		if is_maximizing:
 			value = -math.inf
-			for child in self.get_child_nodes(node, True):
-				value = max(value, self.minimax(child, depth -1, False, move, alpha, beta))
+			for position in self.get_child_moves(board, depth, self.mark, best_move):
+				self.make_move(board, position, self.mark)
+				child_value = self.minimax(board, depth -1, False, move, alpha, beta)
+				self.undo_move(board)
+				if child_value > value:
+					value = child_value
+					best_move = position
 				alpha = max(alpha, value)
 				if beta <= alpha:
+					self.store_cutoff(board, position, depth, self.mark)
+					if stats is not None:
+						ply = len(board.move_stack) - self.root_ply
+						stats.beta_cutoffs[ply] = stats.beta_cutoffs.get(ply, 0) + 1
 					break
-			return value
 		else:
 			value = math.inf
-			for child in self.get_child_nodes(node, False):
-				value = min(value, self.minimax(child, depth -1, True, move, alpha, beta))
+			for position in self.get_child_moves(board, depth, self.opponent_mark, best_move):
+				self.make_move(board, position, self.opponent_mark)
+				child_value = self.minimax(board, depth -1, True, move, alpha, beta)
+				self.undo_move(board)
+				if child_value < value:
+					value = child_value
+					best_move = position
 				beta = min(beta, value)
 				if beta <= alpha:
+					self.store_cutoff(board, position, depth, self.opponent_mark)
+					if stats is not None:
+						ply = len(board.move_stack) - self.root_ply
+						stats.alpha_cutoffs[ply] = stats.alpha_cutoffs.get(ply, 0) + 1
 					break
-			return value
+
+		if value <= alpha_start:
+			bound = Bound.UPPER
+		elif value >= beta_start:
+			bound = Bound.LOWER
+		else:
+			bound = Bound.EXACT
+		if best_move is not None:
+			best_move = board.to_canonical(best_move, symmetry)
+		if is_maximizing:
+			self.table.store(key, value, depth, bound, best_move)
+		else:
+			opponent_bound = bound
+			if bound != Bound.EXACT:
+				opponent_bound = Bound.UPPER if bound == Bound.LOWER else Bound.LOWER
+			self.table.store(key, -value, depth, opponent_bound, best_move)
+		if self.solved is not None and depth >= self.solved_depth and abs(value) >= WIN_THRESHOLD \
+				and self.table_values == table_values:
+			# Lower bound of a win and upper bound of a loss are proven results too
+			if bound == Bound.EXACT or (value > 0) == (bound == Bound.LOWER):
+				self.store_solved(board, key, value, depth)
+		return value
+
+	def get_solved_value(self, solved: Tuple[int, int], depth: int) -> float:
+		"""
+		Converts result from SolvedPositions to the value of the node.
+		:param solved: Tuple of the result (1 for win of X, -1 for win of O, 0 for draw) and number of moves to the end
+		:param depth: Remaining depth of the node
+		:return: Value of the node from perspective of this player, the same as the search would return
+		"""
+		result, distance = solved
+		if self.mark == Mark.O:
+			result = -result
+		return result * (WIN_SCORE + depth - distance)
+
+	def store_solved(self, board: Board, key: int, value: float, depth: int) -> None:
+		"""
+		Stores win or loss proven for moves within candidate radius of the board to SolvedPositions.
+		:param board: Board in the node
+		:param key: Canonical key of the position
+		:param value: Value of the node, at least WIN_THRESHOLD in absolute value
+		:param depth: Remaining depth of the node
+		"""
+		distance = depth - (abs(value) - WIN_SCORE)
+		result = 1 if value > 0 else -1
+		if self.mark == Mark.O:
+			result = -result
+		self.solved.put(key, board.size, board.end_count, board.candidate_radius, result, distance)
 
 
-	def get_child_nodes(self, board: List[Point], this_players_move: bool) -> List[List[Point]]:
+	def get_child_moves(self, board: Board, depth: int, mark: Mark, first_move: Optional[Point] = None) -> Iterator[Point]:
 		"""
-		For currently serached board prepares all possible next moves
+		For currently serached board generates next moves from board's candidate tiles.
+		Moves are ordered so the moves most likely to cause cutoff are searched first.
 		:param board: Currently serached board
-		:param this_players_move: True if currently serach move is played by this 
-								  player, False otherwise
-		:return: List with all possible boards in next move
+		:param depth: Remaining depth of the search
+		:param mark: Mark of the player making the move
+		:param first_move: Best move from transposition table
+		:return: Generator of Points with possible moves
 		"""
-		mark = self.mark
-		if not this_players_move:
-			if self.mark == Mark.O:
-				mark = Mark.X
-			else:
-				mark = Mark.O
-
-		child_nodes = []
-		for x in range(board.size):
-			for y in range(board.size):
-				if board.tiles[x][y] == 0:
-					child = board.copy()
-					child.set_move(Point(x,y), mark) 
-					child_nodes.append(child)
-		return child_nodes
-
-	def get_board_result(self, board: List[Point]) -> Optional[int]:
+		if not self.move_ordering:
+			if first_move is not None:
+				yield first_move
+			# Candidates change while children are searched so they are copied first
+			for index in list(board.candidates):
+				position = board.points[index]
+				if first_move is None or position != first_move:
+					yield position
+			return
+
+		n = board.end_count
+		killers = self.killers.get(len(board.move_stack), [])
+		history = self.history[mark]
+		ordered = []
+		for index in board.candidates:
+			position = board.points[index]
+			threat = 0
+			# Threats are expensive to find so they are used only above leaves
+			if depth >= 2:
+				x_count, o_count = self.evaluator.get_move_threats(board, position)
+				own, other = (x_count, o_count) if mark == Mark.X else (o_count, x_count)
+				if own == n - 1:
+					threat = 4
+				elif other == n - 1:
+					threat = 3
+				elif own == n - 2 or other == n - 2:
+					threat = 2
+				elif own == n - 3 or other == n - 3:
+					threat = 1
+			is_first = first_move is not None and position == first_move
+			ordered.append((threat, is_first, position in killers, history[index], index))
+		ordered.sort(reverse=True)
+		for item in ordered:
+			yield board.points[item[-1]]
+
+	def store_cutoff(self, board: Board, position: Point, depth: int, mark: Mark) -> None:
+		"""
+		Remembers the move that caused alpha-beta cutoff as killer move
+		and increases its history score.
+		:param board: Currently serached board
+		:param position: Point with the move that caused the cutoff
+		:param depth: Remaining depth of the search
+		:param mark: Mark of the player that made the move
+		"""
+		ply = len(board.move_stack)
+		killers = self.killers.setdefault(ply, [])
+		if position not in killers:
+			killers.insert(0, position)
+			del killers[2:]
+		self.history[mark][position.x*board.size + position.y] += depth * depth
+
+	def get_board_result(self, board: Board) -> Optional[int]:
 		"""
 		Checks if the board represents finnished game.
-		:param board: 2D list with board.
+		:param board: Board to check.
 		:return: None if game is not finnished. -1 if player lost, 1 if player won and 0 for draw.
 		"""
 		result = board.check_end()
@@ -133,8 +786,9 @@ class MiniMax():
 		if len(result) == 0:
 			return 0
 
-		if board.tiles[result[0].x][result[0].y] == 1 and self.mark == Mark.X:
+		winner = board.get_tile(result[0].x, result[0].y)
+		if winner == 1 and self.mark == Mark.X:
 			return 1
-		elif board.tiles[result[0].x][result[0].y] == -1 and self.mark == Mark.O:
+		elif winner == -1 and self.mark == Mark.O:
 			return 1
 		return -1
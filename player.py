@@ -1,8 +1,16 @@
 from abc import ABC, abstractmethod
 from random import randrange
 from utils import Point, Mark
-from typing import List, Callable, Optional
-from minimax import MiniMax
+from typing import List, Callable, Optional, Tuple
+from minimax import MiniMax, SearchPool, SearchStats, TranspositionTable
+from book import get_opening_book
+from solved import get_solved_positions
+from threats import ThreatSolver
+from mcts import MCTS, search_parallel
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import math
+import threading
+import time
 
 
 class Player(ABC):
@@ -16,13 +24,20 @@ class Player(ABC):
 		self.color = color
 
 		self.move_listener = None
+		# Function that runs given callable on the thread of the game (e.g. tkinter mainloop).
+		# When it is set players may compute their moves in background.
+		self.move_scheduler = None
+		# SearchStats of the last move for players that search for their moves
+		self.last_stats = None
 
-	# TODO: Change from board to some safe copy of board that cannot alter game state
 	@abstractmethod
 	def move(self, board: List[Point]) -> None:
 		"""
 		Command from game to make a move. After the move is computed it should call send_move().
-		:param board: 2D list with current board
+		Player should release the board (Board.release()) before it sends the move when it does
+		not need the board any more, the game does not have to copy its board then.
+		:param board: Snapshot of the game board, player may change it or use it in other
+					  threads without changing the game (see Board.snapshot())
 		"""
 		pass
 
@@ -41,6 +56,27 @@ class Player(ABC):
 		"""
 		self.move_listener = move_listener
 
+	def bind_move_scheduler(self, move_scheduler: Callable) -> None:
+		"""
+		Binds scheduler that is used to send moves computed in background thread.
+		:param move_scheduler: Thread-safe method that accepts callable without parameters
+							   and calls it later on the thread of the game.
+		"""
+		self.move_scheduler = move_scheduler
+
+	def cancel(self) -> None:
+		"""
+		Cancels move that is being computed. The move is never sent.
+		"""
+		pass
+
+	def close(self) -> None:
+		"""
+		Cancels move that is being computed and stops worker processes and threads
+		of the player. It is called when the player will not play any more games.
+		"""
+		self.cancel()
+
 
 class HumanPlayer(Player):
 	"""
@@ -56,7 +92,7 @@ class HumanPlayer(Player):
 		that will call send_move() directly.
 		:param board: 2D list with current board.
 		"""
-		pass
+		board.release()
 
 
 class RandomPlayer(Player):
@@ -72,6 +108,7 @@ class RandomPlayer(Player):
 		:param board: 2D list with current board.
 		"""
 		empty_tiles = board.get_empty_tiles()
+		board.release()
 		tile_id = randrange(len(empty_tiles))
 		self.send_move(empty_tiles[tile_id])
 
@@ -79,10 +116,63 @@ class RandomPlayer(Player):
 class MiniMaxPlayer(Player):
 	"""
 	Player is using MiniMax algorthm to find the best move.
+	With `time_limit_ms` the search is iteratively deepened until the time runs out
+	and `max_depth` only limits the deepest iteration (None means no limit).
+	With `workers` > 1 root moves are searched in parallel by that many processes. Every
+	process has its own transposition table, so parallel search visits about twice as many
+	nodes as the sequential one - it pays off only when the processes have their own cores.
+	Only empty tiles at most `candidate_radius` from placed marks are searched.
+	With `collect_stats` detailed search statistics are collected in `last_stats`.
+	When move scheduler is bound the search runs in background thread and the move
+	is sent through the scheduler, so GUI is not blocked while the player thinks.
+	With `ponder` (needs move scheduler) the player searches during opponent's turn
+	the position after the reply predicted by principal variation. When the opponent
+	plays the predicted move the pondering search becomes the search of the move,
+	unless the book or threat-space search finds the move (they are probed meanwhile).
+	Positions found in opening book `book_path` are played without search.
+	Wins and losses proven by the search are kept in database `solved_path` that
+	is shared by all games and processes.
+	Before the search threat-space search up to `threat_depth` moves looks for forced
+	win of the player (played without search) and of the opponent (only moves that
+	stop it are searched). Both searches together are limited by `threat_time_limit_ms`
+	and by half of `time_limit_ms`, their time is taken from `time_limit_ms`.
+	0 depth turns it off.
 	"""
-	def __init__(self, end_count: int, mark: Mark, color: str, max_depth: int = 3) -> None:
+	def __init__(self, end_count: int, mark: Mark, color: str, max_depth: Optional[int] = 3, table_size_mb: int = 64, time_limit_ms: Optional[int] = None, workers: int = 1, candidate_radius: int = 1, collect_stats: bool = False, ponder: bool = False, book_path: Optional[str] = None, solved_path: Optional[str] = None, threat_depth: int = 20, threat_time_limit_ms: Optional[int] = 200) -> None:
 		Player.__init__(self, 'MiniMax player', end_count, mark, color)
 		self.max_depth = max_depth
+		self.time_limit_ms = time_limit_ms
+		self.workers = workers
+		self.table_size_mb = table_size_mb
+		self.candidate_radius = candidate_radius
+		self.collect_stats = collect_stats
+		self.ponder = ponder
+		self.book = get_opening_book(book_path) if book_path is not None else None
+		self.solved = get_solved_positions(solved_path) if solved_path is not None else None
+		self.threat_depth = threat_depth
+		self.threat_time_limit_ms = threat_time_limit_ms
+		# Worker processes are started with the first move
+		self.pool = None
+		# Transposition table is kept between moves so positions from previous searches are reused
+		self.table = TranspositionTable(table_size_mb)
+		# Background thread is started with the first move when move scheduler is bound
+		self.executor = None
+		# Thread that probes book and threats after ponder hit while pondering search goes on
+		self.probe_executor = None
+		# Search that is running in background and number of the requested move.
+		# Moves computed for older numbers were cancelled and are never sent.
+		self.search = None
+		self.move_id = 0
+		# Pondering search, zobrist key of its board, its start, its stats when it is finished,
+		# number of the move when the opponent played the predicted move and timer
+		# that stops the search after time limit. Guarded by ponder_lock.
+		self.ponder_lock = threading.Lock()
+		self.ponder_search = None
+		self.ponder_key = None
+		self.ponder_start = 0.0
+		self.ponder_stats = None
+		self.ponder_hit_id = None
+		self.ponder_timer = None
 
 	def move(self, board: List[Point]) -> None:
 		"""
@@ -90,6 +180,358 @@ class MiniMaxPlayer(Player):
 		like first move, one move from winning are hardcoded.
 		:param board: 2D list with current board.
 		"""
-		mm = MiniMax(board, self.mark, self.max_depth)
-		mm.compute()
-		self.send_move(mm.get_best_move())
+		if self.move_scheduler is None:
+			move = self.compute_move(board, self.move_id)
+			board.release()
+			self.send_move(move)
+			return
+
+		if self.executor is None:
+			self.executor = ThreadPoolExecutor(1)
+		with self.ponder_lock:
+			# New number also tells pondering that is just starting that it is too late
+			self.move_id += 1
+			if self.ponder_search is not None and self.ponder_key == board.zobrist_key:
+				if self.probe_executor is None:
+					self.probe_executor = ThreadPoolExecutor(1)
+				self.probe_executor.submit(self.probe_ponder_hit, board, self.move_id)
+				return
+		self.stop_ponder()
+		self.executor.submit(self.compute_move_in_background, board, self.move_id)
+
+	def compute_move(self, board: List[Point], move_id: int) -> Optional[Point]:
+		"""
+		Searches the best move.
+		:param board: Board to search
+		:param move_id: Number of the requested move
+		:return: Point with the best move or None when the move was cancelled before the search started
+		"""
+		start = time.monotonic()
+		move, solver = self.probe(board, start)
+		if move is not None:
+			return move
+
+		root_moves = None
+		if solver is not None:
+			root_moves = solver.find_defences(self.mark, board.get_candidate_tiles())
+			if root_moves is not None and len(root_moves) == 0:
+				# Lost anyway, let the search choose the best resistance
+				root_moves = None
+
+		time_limit_ms = self.time_limit_ms
+		if time_limit_ms is not None:
+			time_limit_ms = max(1.0, time_limit_ms - 1000 * (time.monotonic() - start))
+		mm = self.create_search(board, time_limit_ms, root_moves)
+		self.search = mm
+		if move_id != self.move_id:
+			return None
+		self.last_stats = mm.compute()
+		self.search = None
+		return mm.get_best_move()
+
+	def probe(self, board: List[Point], start: float) -> Tuple[Optional[Point], Optional[ThreatSolver]]:
+		"""
+		Looks for a move that is played without search - book move or the first move of
+		forced win found by threat-space search. Sets last_stats when the move is found.
+		:param board: Board of the position
+		:param start: Time when the move was requested (time.monotonic())
+		:return: Tuple of the move (None when the position has to be searched) and ThreatSolver
+				 that looks for defences later (None when threat search is turned off)
+		"""
+		if self.book is not None:
+			move = self.book.get_move(board)
+			if move is not None:
+				self.last_stats = None
+				return move, None
+
+		if self.threat_depth <= 0:
+			return None, None
+		threat_time_limit_ms = self.threat_time_limit_ms
+		if self.time_limit_ms is not None:
+			threat_time_limit_ms = min(threat_time_limit_ms or math.inf, self.time_limit_ms / 2)
+		# One solver is used for both searches so they share its deadline
+		solver = ThreatSolver(board, self.threat_depth, threat_time_limit_ms)
+		sequence = solver.find_win(self.mark)
+		if sequence is None:
+			return None, solver
+		self.last_stats = SearchStats()
+		self.last_stats.nodes = solver.nodes
+		self.last_stats.time = time.monotonic() - start
+		self.last_stats.depth = len(sequence)
+		self.last_stats.principal_variation = sequence
+		return sequence[0], solver
+
+	def create_search(self, board: List[Point], time_limit_ms: Optional[float], root_moves: Optional[List[Point]] = None) -> MiniMax:
+		"""
+		Creates MiniMax with options of the player.
+		:param board: Board to search
+		:param time_limit_ms: Time limit of the search
+		:param root_moves: Moves searched in the root, None for all candidate tiles
+		:return: New MiniMax
+		"""
+		if self.workers > 1 and self.pool is None:
+			self.pool = SearchPool(self.workers, self.table_size_mb)
+		return MiniMax(board, self.mark, self.max_depth, self.table, time_limit_ms, self.pool, self.candidate_radius,
+					   collect_stats=self.collect_stats, solved=self.solved, root_moves=root_moves)
+
+	def compute_move_in_background(self, board: List[Point], move_id: int) -> None:
+		"""
+		Searches the best move in background thread and schedules sending of the move.
+		:param board: Snapshot of the board
+		:param move_id: Number of the requested move
+		"""
+		move = self.compute_move(board, move_id)
+		ponder = self.ponder and move is not None and self.last_stats is not None
+		if not ponder:
+			board.release()
+		self.move_scheduler(lambda: self.send_move_if_current(move, move_id))
+		if ponder:
+			self.ponder_reply(board, self.last_stats.principal_variation, move_id)
+
+	def send_move_if_current(self, move: Optional[Point], move_id: int) -> None:
+		"""
+		Sends the move unless it was cancelled meanwhile.
+		:param move: Point with the move
+		:param move_id: Number of the move
+		"""
+		if move_id == self.move_id and move is not None:
+			self.send_move(move)
+
+	def ponder_reply(self, board: List[Point], variation: List[Point], move_id: int) -> None:
+		"""
+		Searches in background thread the position after player's move and opponent's
+		reply from principal variation until the search is stopped or `max_depth` is reached.
+		:param board: Snapshot of the board before player's move
+		:param variation: Principal variation starting with player's move
+		:param move_id: Number of the move that was sent
+		"""
+		if len(variation) < 2:
+			return
+		board.set_move(variation[0], self.mark)
+		if board.check_end() is not None:
+			return
+		board.set_move(variation[1], Mark.X if self.mark == Mark.O else Mark.O)
+		if board.check_end() is not None:
+			return
+
+		# Infinite time limit deepens iteratively until the search is stopped
+		mm = self.create_search(board, math.inf)
+		with self.ponder_lock:
+			if move_id != self.move_id:
+				return
+			self.ponder_search = mm
+			self.ponder_key = board.zobrist_key
+			self.ponder_start = time.monotonic()
+			self.ponder_stats = None
+			self.ponder_hit_id = None
+		stats = mm.compute()
+		with self.ponder_lock:
+			if self.ponder_search is not mm:
+				return
+			self.ponder_stats = stats
+			if self.ponder_hit_id is not None:
+				self.finish_ponder()
+
+	def probe_ponder_hit(self, board: List[Point], move_id: int) -> None:
+		"""
+		Opponent played the predicted move. Book move or forced win found by threat-space search
+		is played like without pondering and the pondering search is stopped, otherwise the
+		pondering search becomes the search of the move. Runs in probe thread while pondering goes on.
+		:param board: Snapshot of the board
+		:param move_id: Number of the requested move
+		"""
+		move, solver = self.probe(board, time.monotonic())
+		with self.ponder_lock:
+			if move_id != self.move_id or move is None:
+				board.release()
+				if move_id == self.move_id:
+					self.on_ponder_hit()
+				return
+			self.ponder_search.stop()
+			self.clear_ponder()
+		self.move_scheduler(lambda: self.send_move_if_current(move, move_id))
+		# Like after the search the player ponders the reply to forced win
+		if self.ponder and self.last_stats is not None:
+			self.executor.submit(self.ponder_reply, board, self.last_stats.principal_variation, move_id)
+		else:
+			board.release()
+
+	def on_ponder_hit(self) -> None:
+		"""
+		Opponent played the predicted move. Pondering search continues as the search
+		of this move until it reaches `max_depth` or until it runs for `time_limit_ms`
+		in total - the move is sent at once when the player pondered long enough.
+		Must be called with ponder_lock held.
+		"""
+		self.ponder_hit_id = self.move_id
+		if self.ponder_stats is not None:
+			self.finish_ponder()
+		elif self.time_limit_ms is not None:
+			remaining = self.time_limit_ms / 1000 - (time.monotonic() - self.ponder_start)
+			if remaining <= 0:
+				self.ponder_search.stop()
+			else:
+				self.ponder_timer = threading.Timer(remaining, self.ponder_search.stop)
+				self.ponder_timer.start()
+
+	def finish_ponder(self) -> None:
+		"""
+		Sends move found by pondering search and starts pondering of the next move.
+		Must be called with ponder_lock held after the search ended and the predicted move was played.
+		"""
+		mm = self.ponder_search
+		move_id = self.ponder_hit_id
+		self.last_stats = self.ponder_stats
+		self.clear_ponder()
+		move = mm.get_best_move()
+		self.move_scheduler(lambda: self.send_move_if_current(move, move_id))
+		if move is not None:
+			self.executor.submit(self.ponder_reply, mm.board.snapshot(), self.last_stats.principal_variation, move_id)
+
+	def clear_ponder(self) -> None:
+		"""
+		Forgets pondering search. Must be called with ponder_lock held.
+		"""
+		if self.ponder_timer is not None:
+			self.ponder_timer.cancel()
+		self.ponder_search = None
+		self.ponder_key = None
+		self.ponder_stats = None
+		self.ponder_hit_id = None
+		self.ponder_timer = None
+
+	def stop_ponder(self) -> None:
+		"""
+		Stops pondering search, its result is never used.
+		"""
+		with self.ponder_lock:
+			if self.ponder_search is not None:
+				self.ponder_search.stop()
+			self.clear_ponder()
+
+	def cancel(self) -> None:
+		"""
+		Stops the running search. Its move is never sent.
+		"""
+		self.move_id += 1
+		search = self.search
+		if search is not None:
+			search.stop()
+		self.stop_ponder()
+
+	def close(self) -> None:
+		"""
+		Stops the running search, background thread and worker processes.
+		"""
+		self.cancel()
+		for executor in [self.probe_executor, self.executor]:
+			if executor is not None:
+				executor.shutdown()
+		self.probe_executor = None
+		self.executor = None
+		if self.pool is not None:
+			self.pool.close()
+			self.pool = None
+
+
+class MCTSPlayer(Player):
+	"""
+	Player is using Monte Carlo Tree Search with UCT to find the best move. Every move
+	runs `playouts` random games or runs for `time_limit_ms` (the first limit reached ends
+	the search). The tree is kept between moves when the opponent replied with a move
+	that is in the tree. With `workers` > 1 the same number of independent trees are
+	searched by processes and visits of their root moves are summed (root parallelism).
+	Only empty tiles at most `candidate_radius` from placed marks are moves in the tree,
+	playouts use all empty tiles.
+	When move scheduler is bound the search runs in background thread.
+	"""
+	def __init__(self, end_count: int, mark: Mark, color: str, playouts: Optional[int] = None, time_limit_ms: Optional[int] = 1000, workers: int = 1, candidate_radius: int = 1, exploration: float = 1.4, seed: Optional[int] = None) -> None:
+		Player.__init__(self, 'MCTS player', end_count, mark, color)
+		if playouts is None and time_limit_ms is None:
+			raise ValueError('MCTS player needs playouts or time_limit_ms')
+		self.playouts = playouts
+		self.time_limit_ms = time_limit_ms
+		self.workers = workers
+		self.candidate_radius = candidate_radius
+		self.exploration = exploration
+		self.seed = seed
+		# Tree is created with the first move when the board size is known
+		self.mcts = None
+		# Worker processes are started with the first move and serve all games of the player until close()
+		self.pool = None
+		# Background thread is started with the first move when move scheduler is bound
+		self.executor = None
+		# Moves computed for older numbers were cancelled and are never sent
+		self.move_id = 0
+
+	def move(self, board: List[Point]) -> None:
+		"""
+		Selects the most visited move of the search.
+		:param board: 2D list with current board.
+		"""
+		if self.move_scheduler is None:
+			move = self.compute_move(board, self.move_id)
+			board.release()
+			self.send_move(move)
+			return
+
+		if self.executor is None:
+			self.executor = ThreadPoolExecutor(1)
+		self.move_id += 1
+		self.executor.submit(self.compute_move_in_background, board, self.move_id)
+
+	def compute_move(self, board: List[Point], move_id: int) -> Optional[Point]:
+		"""
+		Searches the best move.
+		:param board: Board to search
+		:param move_id: Number of the requested move
+		:return: Point with the best move or None when the move was cancelled before the search started
+		"""
+		if self.mcts is None or self.mcts.size != board.size:
+			self.mcts = MCTS(board.size, board.end_count, self.exploration, self.candidate_radius, self.seed)
+		if self.workers > 1 and self.pool is None:
+			self.pool = ProcessPoolExecutor(self.workers - 1)
+		self.mcts.set_board(board, self.mark)
+		if move_id != self.move_id:
+			return None
+		index, self.last_stats = search_parallel(self.mcts, self.pool, self.workers, self.playouts, self.time_limit_ms)
+		return self.mcts.masks.points[index]
+
+	def compute_move_in_background(self, board: List[Point], move_id: int) -> None:
+		"""
+		Searches the best move in background thread and schedules sending of the move.
+		:param board: Snapshot of the board
+		:param move_id: Number of the requested move
+		"""
+		move = self.compute_move(board, move_id)
+		board.release()
+		self.move_scheduler(lambda: self.send_move_if_current(move, move_id))
+
+	def send_move_if_current(self, move: Optional[Point], move_id: int) -> None:
+		"""
+		Sends the move unless it was cancelled meanwhile.
+		:param move: Point with the move
+		:param move_id: Number of the move
+		"""
+		if move_id == self.move_id and move is not None:
+			self.send_move(move)
+
+	def cancel(self) -> None:
+		"""
+		Stops the running search. Its move is never sent.
+		"""
+		self.move_id += 1
+		if self.mcts is not None:
+			self.mcts.stop()
+
+	def close(self) -> None:
+		"""
+		Stops the running search, background thread and worker processes.
+		"""
+		self.cancel()
+		if self.executor is not None:
+			self.executor.shutdown()
+			self.executor = None
+		if self.pool is not None:
+			self.pool.shutdown()
+			self.pool = None
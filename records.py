@@ -0,0 +1,295 @@
+from board import get_board_points
+from game import Game
+from player import Player
+from utils import Point, Mark
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+
+# File starts with magic and version, then records of games follow until the end of the file
+RECORDS_MAGIC = b'GMKR'
+RECORDS_VERSION = 1
+# Result byte of the record
+RESULT_UNFINISHED = 0
+RESULT_X = 1
+RESULT_O = 2
+RESULT_DRAW = 3
+
+
+def encode_varint(value: int) -> bytes:
+	"""
+	Encodes non-negative number in 7 bits per byte, the highest bit marks that more bytes follow.
+	:param value: Number to encode
+	:return: Encoded bytes
+	"""
+	out = bytearray()
+	while value >= 0x80:
+		out.append(value & 0x7f | 0x80)
+		value >>= 7
+	out.append(value)
+	return bytes(out)
+
+
+def decode_varint(data: bytes, offset: int) -> Tuple[int, int]:
+	"""
+	Decodes number encoded by encode_varint().
+	:param data: Bytes with the number
+	:param offset: Position of the first byte of the number
+	:return: Tuple of the number and position after it
+	"""
+	value = 0
+	shift = 0
+	while True:
+		byte = data[offset]
+		offset += 1
+		value |= (byte & 0x7f) << shift
+		if byte < 0x80:
+			return value, offset
+		shift += 7
+
+
+class GameRecord:
+	"""
+	Moves and result of one game. Moves are stored as tile indexes (x*size + y), X moves first.
+	"""
+	def __init__(self, board_size: int, end_count: int, player_x: str, player_o: str, indexes: List[int],
+				 result: int = RESULT_UNFINISHED) -> None:
+		self.board_size = board_size
+		self.end_count = end_count
+		self.player_x = player_x
+		self.player_o = player_o
+		self.indexes = indexes
+		self.result = result
+
+	@staticmethod
+	def from_moves(board_size: int, end_count: int, player_x: str, player_o: str, moves: List[Point],
+				   winner: Optional[Mark], finished: bool = True) -> 'GameRecord':
+		"""
+		Creates record from list of moves.
+		:param moves: List of Points with moves of the game, X moves first
+		:param winner: Mark of the winner or None
+		:param finished: False if the game did not end
+		:return: GameRecord
+		"""
+		if not finished:
+			result = RESULT_UNFINISHED
+		elif winner is None:
+			result = RESULT_DRAW
+		else:
+			result = RESULT_X if winner == Mark.X else RESULT_O
+		return GameRecord(board_size, end_count, player_x, player_o, [p.x*board_size + p.y for p in moves], result)
+
+	def get_moves(self) -> List[Point]:
+		"""
+		:return: List of Points with moves of the game
+		"""
+		points = get_board_points(self.board_size)
+		return [points[index] for index in self.indexes]
+
+	def get_winner(self) -> Optional[Mark]:
+		"""
+		:return: Mark of the winner, None for draw or unfinished game
+		"""
+		if self.result == RESULT_X:
+			return Mark.X
+		if self.result == RESULT_O:
+			return Mark.O
+		return None
+
+	def encode(self) -> bytes:
+		"""
+		Encodes the record without its length prefix: board size, end_count and result bytes,
+		names of players (length and UTF-8), number of moves and the moves - one byte per move
+		when all tiles fit into a byte, otherwise varints.
+		:return: Encoded bytes
+		"""
+		x = self.player_x.encode()
+		o = self.player_o.encode()
+		out = bytearray([self.board_size, self.end_count, self.result])
+		out += encode_varint(len(x)) + x + encode_varint(len(o)) + o + encode_varint(len(self.indexes))
+		if self.board_size * self.board_size <= 256:
+			out += bytes(self.indexes)
+		else:
+			for index in self.indexes:
+				out += encode_varint(index)
+		return bytes(out)
+
+	@staticmethod
+	def decode(data: bytes) -> 'GameRecord':
+		"""
+		Decodes record encoded by encode().
+		:param data: Encoded bytes
+		:return: GameRecord
+		:raises ValueError: When the data are not a valid record
+		"""
+		try:
+			board_size, end_count, result = data[0], data[1], data[2]
+			length, offset = decode_varint(data, 3)
+			player_x = data[offset:offset + length].decode()
+			offset += length
+			length, offset = decode_varint(data, offset)
+			player_o = data[offset:offset + length].decode()
+			offset += length
+			if offset > len(data):
+				raise IndexError('name out of the record')
+			count, offset = decode_varint(data, offset)
+			if board_size * board_size <= 256:
+				indexes = list(data[offset:offset + count])
+				offset += count
+			else:
+				indexes = []
+				for i in range(count):
+					index, offset = decode_varint(data, offset)
+					indexes.append(index)
+		except (IndexError, UnicodeDecodeError) as e:
+			raise ValueError(f'Invalid game record: {e}')
+		if offset != len(data) or not 1 <= end_count <= board_size or result > RESULT_DRAW \
+				or count > board_size * board_size or max(indexes, default=0) >= board_size * board_size:
+			raise ValueError('Invalid game record')
+		return GameRecord(board_size, end_count, player_x, player_o, indexes, result)
+
+
+class GameRecordWriter:
+	"""
+	Appends records of games to a file. Every record is prefixed by its length so
+	the reader can skip it. Records are buffered, file is complete after flush() or close().
+	Incomplete record left at the end of the file by killed writer is removed when
+	the file is opened, so new records are not appended after it. Corrupt record
+	followed by other data raises ValueError instead, so no valid record is removed.
+	"""
+	def __init__(self, path: str) -> None:
+		self.path = path
+		self.file: BinaryIO = open(path, 'a+b')
+		self.file.seek(0)
+		if len(self.file.read(len(RECORDS_MAGIC) + 1)) < len(RECORDS_MAGIC) + 1:
+			self.file.truncate(0)
+			self.file.write(RECORDS_MAGIC + bytes([RECORDS_VERSION]))
+		else:
+			self.file.seek(0)
+			read_header(self.file, path)
+			end = self.file.tell()
+			try:
+				for record, end in read_records(self.file, strict=True):
+					pass
+			except ValueError:
+				self.file.close()
+				raise
+			self.file.truncate(end)
+		self.count = 0
+
+	def write(self, record: GameRecord) -> None:
+		"""
+		Appends one game.
+		:param record: GameRecord of the game
+		"""
+		data = record.encode()
+		self.file.write(encode_varint(len(data)) + data)
+		self.count += 1
+
+	def flush(self) -> None:
+		self.file.flush()
+
+	def close(self) -> None:
+		self.file.close()
+
+	def __enter__(self) -> 'GameRecordWriter':
+		return self
+
+	def __exit__(self, *args) -> None:
+		self.close()
+
+
+def read_header(f: BinaryIO, path: str) -> None:
+	"""
+	Reads and checks the header of the file with game records.
+	:param f: File opened for binary reading at its beginning
+	:param path: Path to the file for the error message
+	"""
+	header = f.read(len(RECORDS_MAGIC) + 1)
+	if header[:len(RECORDS_MAGIC)] != RECORDS_MAGIC or header[-1] != RECORDS_VERSION:
+		raise ValueError(f'{path} is not a file with game records of version {RECORDS_VERSION}')
+
+
+def read_records(f: BinaryIO, buffer_size: int = 1 << 20, strict: bool = False) -> Iterator[Tuple[GameRecord, int]]:
+	"""
+	Reads records from the file after its header. Reading stops at a record cut by
+	the end of the file (e.g. writer was killed) or at a corrupt record.
+	:param f: File opened for binary reading after the header
+	:param buffer_size: Number of bytes read at once
+	:param strict: Raise ValueError at a corrupt record that is not cut by the end of the file
+	:return: Generator of tuples of GameRecord and position in the file after it
+	"""
+	position = f.tell()
+	data = b''
+	offset = 0
+	while True:
+		# Length prefix has at most 8 bytes
+		if len(data) - offset < 8:
+			data = data[offset:] + f.read(buffer_size)
+			offset = 0
+			if len(data) == 0:
+				return
+		try:
+			length, start = decode_varint(data, offset)
+		except IndexError:
+			return
+		if start + length > len(data):
+			data = data[offset:] + f.read(max(buffer_size, start + length - len(data)))
+			start -= offset
+			offset = 0
+			if start + length > len(data):
+				return
+		try:
+			record = GameRecord.decode(data[start:start + length])
+		except ValueError as e:
+			if strict:
+				raise ValueError(f'Corrupt game record at byte {position} of the file: {e}')
+			return
+		position += start + length - offset
+		offset = start + length
+		yield record, position
+
+
+def read_games(path: str, buffer_size: int = 1 << 20) -> Iterator[GameRecord]:
+	"""
+	Reads records of games from the file one by one, only a buffer of the file is in memory.
+	Records after a record cut by the end of the file or after a corrupt record are ignored.
+	:param path: Path to the file
+	:param buffer_size: Number of bytes read at once
+	:return: Generator of GameRecords
+	"""
+	with open(path, 'rb') as f:
+		read_header(f, path)
+		for record, position in read_records(f, buffer_size):
+			yield record
+
+
+class GameRecorder:
+	"""
+	Records every game played by Game to GameRecordWriter, also games started by restart.
+	Unfinished game is not recorded.
+	"""
+	def __init__(self, writer: GameRecordWriter, game: Game) -> None:
+		self.writer = writer
+		self.game = game
+		self.moves: List[Point] = []
+		game.add_start_listener(self.on_start)
+		game.add_move_listener(self.on_move)
+		game.add_end_listener(self.on_end)
+
+	def on_start(self) -> None:
+		self.moves = []
+
+	def on_move(self, position: Point, player: Player) -> None:
+		self.moves.append(position)
+
+	def on_end(self, positions: List[Point], player: Player) -> None:
+		"""
+		Writes the game that just ended.
+		:param positions: List of Points with winning marks, empty for draw
+		:param player: Player that made the last move
+		"""
+		game = self.game
+		winner = player.mark if len(positions) > 0 else None
+		self.writer.write(GameRecord.from_moves(game.board_size, game.end_count, game.player_x.name, game.player_o.name,
+												self.moves, winner))
+		self.writer.flush()
@@ -0,0 +1,387 @@
+from game import Game, GameState
+from player import Player
+from tournament import create_player
+from board import Board
+from utils import Point, Mark, MAX_BOARD_SIZE
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+
+
+class RemotePlayer(Player):
+	"""
+	Player whose moves come from a client of the server. Like HumanPlayer it does
+	nothing when asked for a move, server calls send_move() with the client's move.
+	"""
+	def __init__(self, end_count: int, mark: Mark, color: str) -> None:
+		Player.__init__(self, 'Remote player', end_count, mark, color)
+
+	def move(self, board: List[Point]) -> None:
+		board.release()
+
+
+# Longest time of AI player's move in milliseconds, every search of the server is limited by it
+MAX_MOVE_TIME_MS = 5000
+# Options of AI players that clients may set, with their type and range. Other options
+# (files, tables, threads) are not accepted, they would let clients use the server's resources.
+CLIENT_OPTIONS = {
+	'random': {},
+	'minimax': {'max_depth': (int, 1, 20), 'time_limit_ms': (int, 1, MAX_MOVE_TIME_MS), 'candidate_radius': (int, 1, 2),
+				'threat_depth': (int, 0, 40), 'threat_time_limit_ms': (int, 0, MAX_MOVE_TIME_MS)},
+	'mcts': {'playouts': (int, 1, 1000000), 'time_limit_ms': (int, 1, MAX_MOVE_TIME_MS), 'candidate_radius': (int, 1, 2),
+			 'exploration': (float, 0, 10), 'seed': (int, 0, 2**32 - 1)},
+}
+# Players whose moves are so cheap that sending them to the worker processes costs more
+# than the move itself. Their moves are computed directly in the event loop.
+INLINE_PLAYERS = {'random'}
+# Longest message of client in bytes, longer line closes the connection
+MAX_MESSAGE_BYTES = 2**16
+# Number of players kept by every worker process
+MAX_WORKER_PLAYERS = 16
+
+# Players of worker processes by their type, options, end_count and mark. They are
+# kept between moves so transposition tables and trees are reused.
+_worker_players: Dict[tuple, Player] = {}
+
+
+def check_options(name: str, options: dict) -> dict:
+	"""
+	Checks options of AI player sent by client and limits time of its moves.
+	:param name: Player type from CLIENT_OPTIONS
+	:param options: Options sent by client
+	:return: Options for the player's constructor
+	"""
+	if not isinstance(options, dict):
+		raise ValueError('Options must be an object')
+	limits = CLIENT_OPTIONS[name]
+	checked = {}
+	for option, value in options.items():
+		if option not in limits:
+			raise ValueError(f'Option {option} is not allowed for {name}')
+		value_type, low, high = limits[option]
+		if isinstance(value, bool) or not isinstance(value, (int, float)) or (value_type is int and not isinstance(value, int)):
+			raise ValueError(f'Option {option} must be {value_type.__name__}')
+		if not low <= value <= high:
+			raise ValueError(f'Option {option} must be from {low} to {high}')
+		checked[option] = value
+	if 'time_limit_ms' in limits:
+		checked.setdefault('time_limit_ms', MAX_MOVE_TIME_MS)
+	return checked
+
+
+def _compute_move(name: str, options: dict, size: int, end_count: int, mark: Mark, moves: List[Point]) -> Point:
+	"""
+	Computes move of AI player in worker process.
+	:param name: Player type from PLAYER_TYPES
+	:param options: Options of the player
+	:param size: Size of the board
+	:param end_count: Number of marks in a row necessary for winning
+	:param mark: Mark of the player
+	:param moves: List of Points with all moves of the game, X moves first
+	:return: Point with the move
+	"""
+	key = (name, repr(sorted(options.items())), end_count, mark)
+	if key not in _worker_players:
+		if len(_worker_players) >= MAX_WORKER_PLAYERS:
+			# The least recently used player is dropped
+			_worker_players.pop(next(iter(_worker_players))).close()
+		_worker_players[key] = create_player(name, options, end_count, mark)
+	player = _worker_players.pop(key)
+	_worker_players[key] = player
+	board = Board(size, end_count)
+	for i, position in enumerate(moves):
+		board.set_move(position, Mark.X if i % 2 == 0 else Mark.O)
+	result = []
+	player.bind_game_move(lambda position, p: result.append(position))
+	player.move(board)
+	return result[0]
+
+
+class ProcessPlayer(Player):
+	"""
+	AI player of the server. Its moves are computed by a pool of worker processes
+	(or directly in the event loop when there is no pool or the player is in INLINE_PLAYERS),
+	so a long search does not stop other games. The move is sent from the event loop when
+	it is computed.
+	When the computation fails `error_listener` is called with the exception.
+	"""
+	def __init__(self, end_count: int, mark: Mark, color: str, name: str, options: dict, executor: Optional[ProcessPoolExecutor], error_listener: Callable) -> None:
+		Player.__init__(self, f'{name} player', end_count, mark, color)
+		self.type_name = name
+		self.options = options
+		self.executor = executor
+		self.error_listener = error_listener
+		# Player computing the moves in the event loop, created with the first such move
+		self.player: Optional[Player] = None
+		# Moves computed for older numbers were cancelled and are never sent
+		self.move_id = 0
+
+	def move(self, board: List[Point]) -> None:
+		"""
+		Starts computation of the move in worker process.
+		:param board: Board of the game
+		"""
+		self.move_id += 1
+		if self.executor is None or self.type_name in INLINE_PLAYERS:
+			self.move_inline(board)
+			return
+		args = (self.type_name, self.options, board.size, self.end_count, self.mark, list(board.move_stack))
+		board.release()
+		move_id = self.move_id
+		future = asyncio.get_running_loop().run_in_executor(self.executor, _compute_move, *args)
+		future.add_done_callback(lambda f: self.on_move_computed(f, move_id))
+
+	def move_inline(self, board: Board) -> None:
+		"""
+		Computes the move in the event loop on the board of the game and sends it.
+		:param board: Board of the game
+		"""
+		result = []
+		try:
+			if self.player is None:
+				self.player = create_player(self.type_name, self.options, self.end_count, self.mark)
+			self.player.bind_game_move(lambda position, p: result.append(position))
+			self.player.move(board)
+		except Exception as e:
+			self.error_listener(e)
+			return
+		self.send_move(result[0])
+
+	def on_move_computed(self, future: asyncio.Future, move_id: int) -> None:
+		"""
+		Sends computed move unless it was cancelled meanwhile.
+		:param future: Future with the move
+		:param move_id: Number of the move
+		"""
+		if future.cancelled() or move_id != self.move_id:
+			return
+		try:
+			move = future.result()
+		except Exception as e:
+			self.error_listener(e)
+			return
+		self.send_move(move)
+
+	def cancel(self) -> None:
+		"""
+		Cancels move that is being computed. The move is never sent.
+		"""
+		self.move_id += 1
+
+	def close(self) -> None:
+		"""
+		Cancels the move and closes player computing the moves in the event loop.
+		"""
+		self.cancel()
+		if self.player is not None:
+			self.player.close()
+			self.player = None
+
+
+class Connection:
+	"""
+	One client connected to the server. Client and server exchange JSON messages,
+	one per line. Client sends:
+	{"type": "new", "request": any, "board_size": 10, "end_count": 4, "mark": "X",
+	 "opponent": "random", "options": {}} - starts game against AI player from CLIENT_OPTIONS,
+	 client plays `mark`. Without opponent client plays both marks.
+	{"type": "move", "game": id, "x": 0, "y": 0} - move of the client in the game.
+	{"type": "close", "game": id} - ends the game.
+	Server sends:
+	{"type": "started", "request": any, "game": id} - game was created.
+	{"type": "error", "message": "..."} - invalid message of the client, with "game": id
+	 when AI player of the game failed and the game was closed. Message longer than
+	 MAX_MESSAGE_BYTES is answered by error and the connection is closed.
+	{"type": "mark", "game": id, "x": 0, "y": 0, "mark": "X"} - every move of the game.
+	{"type": "end", "game": id, "x": 0, "y": 0, "mark": "X", "winner": "X", "line": [[0, 0], ...]}
+	 - the last move and result of the game, winner is null for draw.
+	{"type": "error", "message": text} - invalid message or move.
+	"""
+	def __init__(self, server: 'GameServer', reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+		self.server = server
+		self.reader = reader
+		self.writer = writer
+		self.games: Dict[int, Game] = {}
+
+	async def run(self) -> None:
+		"""
+		Handles messages of the client until it disconnects.
+		"""
+		try:
+			while True:
+				try:
+					line = await self.reader.readline()
+				except ValueError:
+					# Line is longer than the limit of the stream, the rest of it cannot be read
+					# as a message, so the connection is closed after the error is sent.
+					self.send({'type': 'error', 'message': f'Message is longer than {MAX_MESSAGE_BYTES} bytes'})
+					await self.writer.drain()
+					break
+				if not line:
+					break
+				try:
+					self.handle_message(json.loads(line))
+				except (ValueError, KeyError, TypeError) as e:
+					self.send({'type': 'error', 'message': str(e)})
+				await self.writer.drain()
+		except ConnectionError:
+			pass
+		finally:
+			for game_id in list(self.games):
+				self.close_game(game_id)
+			self.writer.close()
+
+	def handle_message(self, message: dict) -> None:
+		"""
+		Handles one message of the client.
+		:param message: Decoded JSON message
+		"""
+		if message['type'] == 'new':
+			self.new_game(message)
+		elif message['type'] == 'move':
+			self.on_move(message['game'], int(message['x']), int(message['y']))
+		elif message['type'] == 'close':
+			self.close_game(message['game'])
+		else:
+			raise ValueError(f'Unknown message type {message["type"]}')
+
+	def new_game(self, message: dict) -> None:
+		"""
+		Creates new game. Game starts when its listeners are bound, AI player may move at once.
+		:param message: Message with options of the game
+		"""
+		size = int(message.get('board_size', 10))
+		end_count = int(message.get('end_count', 4))
+		if not 1 <= size <= MAX_BOARD_SIZE or not 1 <= end_count <= size:
+			raise ValueError('Invalid board size or end count')
+		mark = Mark[message.get('mark', 'X')]
+		opponent = message.get('opponent')
+		if opponent is not None and opponent not in CLIENT_OPTIONS:
+			raise ValueError(f'Unknown opponent {opponent}')
+
+		game_id = self.server.next_game_id()
+		remote = RemotePlayer(end_count, mark, '')
+		other_mark = Mark.O if mark == Mark.X else Mark.X
+		if opponent is None:
+			other = RemotePlayer(end_count, other_mark, '')
+		else:
+			options = check_options(opponent, message.get('options', {}))
+			other = ProcessPlayer(end_count, other_mark, '', opponent, options, self.server.executor,
+								  lambda e: self.on_player_error(game_id, e))
+		player_x, player_o = (remote, other) if mark == Mark.X else (other, remote)
+
+		game = Game(player_x, player_o, end_count, size)
+		self.games[game_id] = game
+		self.server.games += 1
+		self.send({'type': 'started', 'request': message.get('request'), 'game': game_id})
+		game.bind_draw_mark_listener(lambda position, player: self.on_new_mark(game_id, position, player))
+		game.bind_end_game_listener(lambda positions, player: self.on_end_game(game_id, positions, player))
+
+	def on_move(self, game_id: int, x: int, y: int) -> None:
+		"""
+		Routes move of the client to the remote player that is on move.
+		:param game_id: Id of the game
+		:param x: X coordinate of the move
+		:param y: Y coordinate of the move
+		"""
+		game = self.games[game_id]
+		if game.state == GameState.WAITING_FOR_X:
+			player = game.player_x
+		elif game.state == GameState.WAITING_FOR_O:
+			player = game.player_o
+		else:
+			player = None
+		size = game.board.size
+		# Point is taken from the board only after the coordinates are checked
+		if not isinstance(player, RemotePlayer) or not (0 <= x < size and 0 <= y < size):
+			raise ValueError(f'Invalid move [{x}:{y}] in game {game_id}')
+		position = game.board.points[x*size + y]
+		if not game.board.is_valid_move(position):
+			raise ValueError(f'Invalid move {position} in game {game_id}')
+		player.send_move(position)
+
+	def on_player_error(self, game_id: int, error: Exception) -> None:
+		"""
+		Closes the game whose AI player failed to compute its move and tells it to the client.
+		:param game_id: Id of the game
+		:param error: Exception of the computation
+		"""
+		if game_id in self.games:
+			self.close_game(game_id)
+			self.send({'type': 'error', 'game': game_id, 'message': f'AI player failed: {error!r}'})
+
+	def on_new_mark(self, game_id: int, position: Point, player: Player) -> None:
+		self.send({'type': 'mark', 'game': game_id, 'x': position.x, 'y': position.y, 'mark': player.mark.name})
+
+	def on_end_game(self, game_id: int, positions: List[Point], player: Player) -> None:
+		game = self.games.pop(game_id)
+		self.server.games -= 1
+		game.close()
+		position = game.board.move_stack[-1]
+		self.send({'type': 'end', 'game': game_id, 'x': position.x, 'y': position.y, 'mark': player.mark.name,
+				   'winner': player.mark.name if len(positions) > 0 else None, 'line': [[p.x, p.y] for p in positions]})
+
+	def close_game(self, game_id: int) -> None:
+		"""
+		Ends the game and cancels moves computed for it.
+		:param game_id: Id of the game
+		"""
+		game = self.games.pop(game_id, None)
+		if game is not None:
+			self.server.games -= 1
+			game.close()
+
+	def send(self, message: dict) -> None:
+		"""
+		Sends message to the client. Messages are buffered by the writer.
+		:param message: Message to encode as JSON
+		"""
+		if not self.writer.is_closing():
+			self.writer.write(json.dumps(message).encode() + b'\n')
+
+
+class GameServer:
+	"""
+	Asyncio TCP server that hosts games of connected clients. Every client may play
+	any number of games at once. Moves of AI opponents are computed by `workers` processes.
+	"""
+	def __init__(self, host: str = '127.0.0.1', port: int = 8765, workers: int = 1) -> None:
+		self.host = host
+		self.port = port
+		self.executor = ProcessPoolExecutor(workers) if workers > 0 else None
+		self.last_game_id = 0
+		# Number of running games
+		self.games = 0
+
+	def next_game_id(self) -> int:
+		self.last_game_id += 1
+		return self.last_game_id
+
+	async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+		await Connection(self, reader, writer).run()
+
+	async def serve(self) -> None:
+		"""
+		Runs the server until it is cancelled.
+		"""
+		server = await asyncio.start_server(self.handle_client, self.host, self.port, limit=MAX_MESSAGE_BYTES)
+		try:
+			async with server:
+				await server.serve_forever()
+		finally:
+			if self.executor is not None:
+				self.executor.shutdown(cancel_futures=True)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Runs server for games over TCP with JSON messages.')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8765)
+	parser.add_argument('--workers', type=int, default=1, help='Number of processes computing moves of AI players, 0 computes them in the server process')
+	args = parser.parse_args()
+	try:
+		asyncio.run(GameServer(args.host, args.port, args.workers).serve())
+	except KeyboardInterrupt:
+		pass
@@ -0,0 +1,152 @@
+from typing import Dict, Optional, Tuple
+import sqlite3
+import threading
+import time
+
+
+class SolvedPositions:
+	"""
+	Database of positions with results proven by the search - win of X, win of O
+	or draw and number of moves to the end of the game. The search plays only
+	candidate tiles, so results are proven only for moves at most `candidate_radius`
+	from marks and they are stored separately for every radius. The database is a SQLite
+	file so it is kept between games and can be used by more processes at once.
+	Positions are stored under canonical keys (see Board.get_canonical_key()).
+	New results are collected in memory and written by flush() in one transaction.
+	When the database has more than `max_entries` positions the least recently
+	used ones are deleted. One object can be shared by players searching in different threads.
+	"""
+	def __init__(self, path: str, max_entries: int = 1000000) -> None:
+		self.path = path
+		self.max_entries = max_entries
+		# Other processes may hold the write lock for a while
+		self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+		self.lock = threading.Lock()
+		# Switching new database to WAL mode does not wait for lock of other process
+		for attempt in range(600):
+			try:
+				self.connection.execute('PRAGMA journal_mode=WAL')
+				break
+			except sqlite3.OperationalError:
+				time.sleep(0.1)
+		self.connection.execute('PRAGMA synchronous=NORMAL')
+		columns = [row[1] for row in self.connection.execute('PRAGMA table_info(positions)')]
+		if len(columns) > 0 and 'candidate_radius' not in columns:
+			# Results of older databases do not say for which candidate radius they were proven
+			self.connection.execute('DROP TABLE IF EXISTS positions')
+		self.connection.execute('''CREATE TABLE IF NOT EXISTS positions (
+			key INTEGER NOT NULL,
+			size INTEGER NOT NULL,
+			end_count INTEGER NOT NULL,
+			candidate_radius INTEGER NOT NULL,
+			result INTEGER NOT NULL,
+			distance INTEGER NOT NULL,
+			used REAL NOT NULL,
+			PRIMARY KEY (key, size, end_count, candidate_radius))''')
+		self.connection.execute('CREATE INDEX IF NOT EXISTS positions_used ON positions (used)')
+		self.connection.commit()
+		# Results that are not written yet and keys of positions that were read
+		self.pending: Dict[Tuple[int, int, int, int], Tuple[int, int]] = {}
+		self.used = set()
+
+	@staticmethod
+	def to_signed(key: int) -> int:
+		"""
+		SQLite integers are signed 64-bit numbers.
+		:param key: Unsigned 64-bit key
+		:return: The same bits as signed number
+		"""
+		return key - 2**64 if key >= 2**63 else key
+
+	def get(self, key: int, size: int, end_count: int, candidate_radius: int) -> Optional[Tuple[int, int]]:
+		"""
+		Finds result of the position.
+		:param key: Canonical key of the position
+		:param size: Size of the board
+		:param end_count: Number of marks in a row necessary for winning
+		:param candidate_radius: Candidate radius of the search
+		:return: None if the position is not solved. Otherwise tuple of the result
+				 (1 for win of X, -1 for win of O and 0 for draw) and number of moves to the end.
+		"""
+		entry = (key, size, end_count, candidate_radius)
+		with self.lock:
+			if entry in self.pending:
+				return self.pending[entry]
+			row = self.connection.execute('SELECT result, distance FROM positions WHERE key=? AND size=? AND end_count=? AND candidate_radius=?',
+										  (self.to_signed(key), size, end_count, candidate_radius)).fetchone()
+			if row is not None:
+				self.used.add(entry)
+		return row
+
+	def put(self, key: int, size: int, end_count: int, candidate_radius: int, result: int, distance: int) -> None:
+		"""
+		Stores result of the position. It is written to the database by flush().
+		:param key: Canonical key of the position
+		:param size: Size of the board
+		:param end_count: Number of marks in a row necessary for winning
+		:param candidate_radius: Candidate radius of the search that proved the result
+		:param result: 1 for win of X, -1 for win of O and 0 for draw
+		:param distance: Number of moves to the end of the game
+		"""
+		entry = (key, size, end_count, candidate_radius)
+		with self.lock:
+			old = self.pending.get(entry)
+			if old is None or distance < old[1]:
+				self.pending[entry] = (result, distance)
+
+	def flush(self) -> None:
+		"""
+		Writes new results, marks read positions as used and deletes least recently
+		used positions over `max_entries`.
+		"""
+		with self.lock:
+			if len(self.pending) > 0 or len(self.used) > 0:
+				self.write()
+
+	def write(self) -> None:
+		"""
+		Writes pending results and used positions in one transaction. Must be called with lock held.
+		"""
+		now = time.time()
+		with self.connection:
+			self.connection.executemany(
+				'''INSERT INTO positions (key, size, end_count, candidate_radius, result, distance, used) VALUES (?, ?, ?, ?, ?, ?, ?)
+				ON CONFLICT (key, size, end_count, candidate_radius) DO UPDATE SET
+				distance=min(distance, excluded.distance), used=excluded.used''',
+				[(self.to_signed(key), size, end_count, radius, result, distance, now)
+				 for (key, size, end_count, radius), (result, distance) in self.pending.items()])
+			self.connection.executemany('UPDATE positions SET used=? WHERE key=? AND size=? AND end_count=? AND candidate_radius=?',
+										[(now, self.to_signed(key), size, end_count, radius) for key, size, end_count, radius in self.used])
+			if len(self.pending) > 0:
+				count = self.connection.execute('SELECT COUNT(*) FROM positions').fetchone()[0]
+				if count > self.max_entries:
+					self.connection.execute('DELETE FROM positions WHERE rowid IN (SELECT rowid FROM positions ORDER BY used LIMIT ?)',
+											(count - self.max_entries,))
+		self.pending.clear()
+		self.used.clear()
+
+	def __len__(self) -> int:
+		# Only positions written to the database are counted
+		with self.lock:
+			return self.connection.execute('SELECT COUNT(*) FROM positions').fetchone()[0]
+
+	def close(self) -> None:
+		"""
+		Writes new results and closes the database.
+		"""
+		self.flush()
+		self.connection.close()
+
+
+_solved_cache: Dict[str, SolvedPositions] = {}
+
+
+def get_solved_positions(path: str) -> SolvedPositions:
+	"""
+	Returns database of solved positions. Every file is opened only once in each process.
+	:param path: Path to the database file
+	:return: SolvedPositions
+	"""
+	if path not in _solved_cache:
+		_solved_cache[path] = SolvedPositions(path)
+	return _solved_cache[path]
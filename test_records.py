@@ -0,0 +1,102 @@
+from records import GameRecord, GameRecordWriter, read_games, encode_varint, decode_varint, RESULT_X, RESULT_DRAW
+from utils import Point, Mark
+import os
+import tempfile
+import unittest
+
+
+class TestGameRecords(unittest.TestCase):
+	def setUp(self) -> None:
+		handle, self.path = tempfile.mkstemp(suffix='.gmk')
+		os.close(handle)
+		os.remove(self.path)
+
+	def tearDown(self) -> None:
+		if os.path.exists(self.path):
+			os.remove(self.path)
+
+	def create_records(self, count: int, size: int = 10) -> list:
+		records = []
+		for i in range(count):
+			moves = [Point((i + j) % size, (3*j) % size) for j in range(size)]
+			records.append(GameRecord.from_moves(size, 4, 'random', f'minimax {i}', moves, Mark.X if i % 2 == 0 else None))
+		return records
+
+	def assert_same(self, records: list, read: list) -> None:
+		self.assertEqual(len(records), len(read))
+		for record, other in zip(records, read):
+			self.assertEqual(record.encode(), other.encode())
+
+	def test_varint(self) -> None:
+		for value in [0, 1, 127, 128, 300, 2**21, 2**40]:
+			data = b'\x00' + encode_varint(value)
+			self.assertEqual(decode_varint(data, 1), (value, len(data)))
+
+	def test_round_trip(self) -> None:
+		for size in [10, 16, 19]:
+			record = self.create_records(1, size)[0]
+			decoded = GameRecord.decode(record.encode())
+			self.assertEqual(decoded.indexes, record.indexes)
+			self.assertEqual((decoded.board_size, decoded.end_count, decoded.player_x, decoded.player_o),
+							 (size, 4, 'random', 'minimax 0'))
+			self.assertEqual(decoded.result, RESULT_X)
+			self.assertEqual(decoded.get_moves(), record.get_moves())
+
+	def test_writer_and_reader(self) -> None:
+		records = self.create_records(5)
+		with GameRecordWriter(self.path) as writer:
+			for record in records[:3]:
+				writer.write(record)
+		with GameRecordWriter(self.path) as writer:
+			for record in records[3:]:
+				writer.write(record)
+		self.assert_same(records, list(read_games(self.path, buffer_size=16)))
+		self.assertEqual(list(read_games(self.path))[1].result, RESULT_DRAW)
+
+	def test_append_after_cut_record(self) -> None:
+		records = self.create_records(5)
+		with GameRecordWriter(self.path) as writer:
+			for record in records[:3]:
+				writer.write(record)
+		# Writer killed in the middle of the last record
+		with open(self.path, 'r+b') as f:
+			f.truncate(os.path.getsize(self.path) - 3)
+		self.assert_same(records[:2], list(read_games(self.path)))
+		with GameRecordWriter(self.path) as writer:
+			for record in records[3:]:
+				writer.write(record)
+		self.assert_same(records[:2] + records[3:], list(read_games(self.path)))
+
+	def test_corrupt_record(self) -> None:
+		records = self.create_records(3)
+		with GameRecordWriter(self.path) as writer:
+			for record in records:
+				writer.write(record)
+		with open(self.path, 'r+b') as f:
+			data = bytearray(f.read())
+			# Move of the last record out of the board
+			data[-1] = 255
+			f.seek(0)
+			f.write(data)
+		self.assert_same(records[:2], list(read_games(self.path)))
+
+	def test_append_after_corrupt_record(self) -> None:
+		records = self.create_records(3)
+		with GameRecordWriter(self.path) as writer:
+			for record in records:
+				writer.write(record)
+		with open(self.path, 'r+b') as f:
+			data = bytearray(f.read())
+			# Number of moves of the first record is larger than the board
+			data[data.index(b'minimax 0') + len('minimax 0')] = 127
+			f.seek(0)
+			f.write(data)
+		with self.assertRaises(ValueError):
+			GameRecordWriter(self.path)
+		# Valid records after the corrupt one are kept
+		with open(self.path, 'rb') as f:
+			self.assertEqual(f.read(), data)
+
+
+if __name__ == '__main__':
+	unittest.main()
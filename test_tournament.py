@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+import unittest
+
+TOURNAMENT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tournament.py')
+
+
+class TestTournament(unittest.TestCase):
+	def run_tournament(self, *args: str) -> str:
+		# Tournament runs in its own process, it would not exit when worker processes of players were left running
+		result = subprocess.run([sys.executable, TOURNAMENT, *args, '--games', '2', '--workers', '2', '--board-size', '6'],
+								stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, timeout=60)
+		self.assertEqual(result.returncode, 0, result.stderr)
+		return result.stdout
+
+	def test_minimax_workers(self) -> None:
+		output = self.run_tournament('minimax', 'random', '--a-option', 'workers=2', '--a-option', 'max_depth=1')
+		self.assertIn('Average game length', output)
+
+	def test_mcts_workers(self) -> None:
+		output = self.run_tournament('mcts', 'mcts', '--a-option', 'workers=2', '--a-option', 'playouts=50',
+									 '--b-option', 'workers=2', '--b-option', 'playouts=50')
+		self.assertIn('Average game length', output)
+
+
+if __name__ == '__main__':
+	unittest.main()
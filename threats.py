@@ -0,0 +1,305 @@
+from board import Board
+from evaluation import Evaluator
+from minimax import SearchTimeout
+from utils import Point, Mark
+from typing import Dict, List, Optional, Set, Tuple
+import time
+
+
+class ThreatSolver:
+	"""
+	Threat-space search for forced wins. Attacker plays only threats - fours (moves
+	after which it wins with the next move) and, when `threes` are enabled, moves
+	after which it threatens to make double four. Defender plays only moves that
+	stop the threat or its own fours. The tree is so narrow that the search reaches
+	forced wins much deeper than full-width MiniMax. Attacker's moves are taken only
+	from candidate tiles, but all empty tiles that can stop the threat are tried as
+	defences, so found wins are forced.
+	Search with fours only (VCF - victory by continuous fours) is tried first.
+	"""
+	def __init__(self, board: Board, max_depth: int = 20, time_limit_ms: Optional[int] = None, threes: bool = True) -> None:
+		self.board = board.snapshot()
+		# Only line reading of the evaluator is used, its score is not updated
+		self.evaluator = Evaluator(self.board)
+		self.n = board.end_count
+		self.max_depth = max_depth
+		self.threes = threes
+		self.deadline = None if time_limit_ms is None else time.monotonic() + time_limit_ms / 1000
+		self.nodes = 0
+		# Most marks of X and O in one window through every candidate tile (see Evaluator.get_move_threats()),
+		# they are updated only on lines through every move and stored for undo
+		self.counts: Dict[int, Tuple[int, int]] = {index: self.evaluator.get_move_threats(self.board, self.board.points[index])
+												   for index in self.board.candidates}
+		self.counts_stack: List[Dict[int, Tuple[int, int]]] = []
+		# Depth (in plies) to which attacker failed to win from position with given zobrist key
+		self.failed: Dict[int, int] = {}
+
+	def find_win(self, mark: Mark) -> Optional[List[Point]]:
+		"""
+		Searches forced win of the player that is on move.
+		:param mark: Mark of the attacker
+		:return: None if no forced win was found. Otherwise list of Points with moves of both players
+				 starting with attacker's move. It ends with attacker's move that cannot be defended.
+		"""
+		for threes in [False, True] if self.threes else [False]:
+			self.failed = {}
+			try:
+				sequence = self.attack(mark, self.max_depth, threes)
+			except SearchTimeout:
+				return None
+			if sequence is not None:
+				return sequence
+		return None
+
+	def find_defences(self, mark: Mark, candidates: List[Point]) -> Optional[List[Point]]:
+		"""
+		Checks if the opponent would have forced win if it was on move and finds
+		moves that prevent it.
+		:param mark: Mark of the player on move
+		:param candidates: List of Points with moves of the player to check
+		:return: None if the opponent has no forced win or the time run out. Otherwise
+				 list of Points with moves after which the opponent has no forced win (may be empty).
+		"""
+		opponent = Mark.X if mark == Mark.O else Mark.O
+		sequence = self.find_win(opponent)
+		if sequence is None:
+			return None
+
+		# Moves of the winning sequence are the most likely defences
+		cells = set(sequence)
+		candidates = sorted(candidates, key=lambda p: p not in cells)
+		defences = []
+		for position in candidates:
+			self.play(position, mark)
+			if self.board.check_move(position) is not None:
+				defences.append(position)
+			else:
+				sequence = self.find_win(opponent)
+				if sequence is None:
+					if self.deadline is not None and time.monotonic() > self.deadline:
+						self.take_back()
+						return None
+					defences.append(position)
+			self.take_back()
+		return defences
+
+	def attack(self, mark: Mark, depth: int, threes: bool) -> Optional[List[Point]]:
+		"""
+		Searches threats of the attacker (OR node).
+		:param mark: Mark of the attacker that is on move
+		:param depth: Remaining number of moves of both players
+		:param threes: True if threes are searched together with fours
+		:return: Winning sequence or None
+		"""
+		self.nodes += 1
+		# Nodes are slow enough to check the clock in each of them
+		if self.deadline is not None and time.monotonic() > self.deadline:
+			raise SearchTimeout()
+		attacker, defender = self.get_threat_counts(mark)
+		for index, count in attacker.items():
+			if count == self.n - 1:
+				return [self.board.points[index]]
+		if depth <= 0:
+			return None
+		key = self.board.zobrist_key
+		if self.failed.get(key, -1) >= depth:
+			return None
+
+		defender_wins = [index for index, count in defender.items() if count == self.n - 1]
+		if len(defender_wins) > 1:
+			moves = []
+		elif len(defender_wins) == 1:
+			# Defender's four has to be blocked, the block has to be a threat too
+			moves = defender_wins
+		else:
+			moves = [index for index, count in attacker.items() if count == self.n - 2]
+			# Double fours win at once
+			moves.sort(key=lambda index: not self.is_double(mark, index))
+			if threes and self.n > 3:
+				moves += [index for index, count in attacker.items() if count == self.n - 3]
+
+		for index in moves:
+			position = self.board.points[index]
+			self.play(position, mark)
+			sequence = self.defend(mark, depth - 1, threes)
+			self.take_back()
+			if sequence is not None:
+				return [position] + sequence
+		self.failed[key] = depth
+		return None
+
+	def defend(self, mark: Mark, depth: int, threes: bool) -> Optional[List[Point]]:
+		"""
+		Searches all defences against attacker's threat (AND node).
+		:param mark: Mark of the attacker, defender is on move
+		:param depth: Remaining number of moves of both players
+		:param threes: True if threes are searched together with fours
+		:return: Winning sequence for the first defence or None if some defence holds
+		"""
+		opponent = Mark.X if mark == Mark.O else Mark.O
+		if self.deadline is not None and time.monotonic() > self.deadline:
+			raise SearchTimeout()
+		attacker, defender = self.get_threat_counts(mark)
+		if any(count == self.n - 1 for count in defender.values()):
+			return None
+		wins = [index for index, count in attacker.items() if count == self.n - 1]
+		if len(wins) >= 2:
+			return [self.board.points[wins[0]], self.board.points[wins[1]]]
+		if depth <= 0:
+			return None
+
+		if len(wins) == 1:
+			defences = wins
+		elif threes:
+			doubles = [index for index, count in attacker.items() if count == self.n - 2 and self.is_double(mark, index)]
+			if len(doubles) == 0:
+				return None
+			defences = self.get_three_defences(mark, doubles)
+			if len(defences) == 0:
+				return [self.board.points[doubles[0]]]
+		else:
+			return None
+
+		result = None
+		for index in defences:
+			position = self.board.points[index]
+			self.play(position, opponent)
+			sequence = self.attack(mark, depth - 1, threes)
+			self.take_back()
+			if sequence is None:
+				return None
+			if result is None:
+				result = [position] + sequence
+		return result
+
+	def get_three_defences(self, mark: Mark, doubles: List[int]) -> List[int]:
+		"""
+		Finds defender's moves after which the attacker cannot make double four
+		and defender's fours that force the attacker to block. All empty tiles
+		are considered, not only candidate tiles.
+		:param mark: Mark of the attacker
+		:param doubles: Indexes of tiles where the attacker makes double four
+		:return: List of indexes of tiles with defences, fours first
+		"""
+		opponent = Mark.X if mark == Mark.O else Mark.O
+		defences = self.get_four_tiles(opponent)
+		# Only tiles on a line through double four within end_count can stop it
+		tiles = set()
+		for double in doubles:
+			tiles |= self.get_line_tiles(double)
+		for index in sorted(tiles):
+			if index in defences:
+				continue
+			self.board.set_move(self.board.points[index], opponent)
+			stopped = all(double == index or not self.is_double(mark, double) for double in doubles)
+			self.board.undo_move()
+			if stopped:
+				defences.append(index)
+		return defences
+
+	def get_line_tiles(self, index: int) -> Set[int]:
+		"""
+		Finds empty tiles on the four lines through the tile less than end_count tiles from it.
+		:param index: Index of the tile
+		:return: Set of indexes of the empty tiles
+		"""
+		board = self.board
+		return {tile for line, center in board.lines[index] for tile in line if board.get_tile_by_index(tile) == 0}
+
+	def get_four_tiles(self, mark: Mark) -> List[int]:
+		"""
+		Finds all empty tiles where the player makes four - `end_count` - 1 marks in one
+		window without marks of the other player. Such tiles may be further than
+		candidate_radius from the marks, they are only on lines through player's marks.
+		:param mark: Mark of the player
+		:return: Sorted list of indexes of the tiles
+		"""
+		board = self.board
+		size = board.size
+		value = 1 if mark == Mark.X else -1
+		tiles = set()
+		for position in board.move_stack:
+			index = position.x*size + position.y
+			if board.get_tile_by_index(index) == value:
+				tiles |= self.get_line_tiles(index)
+		fours = []
+		for index in sorted(tiles):
+			counts = self.counts.get(index)
+			if counts is None:
+				counts = self.evaluator.get_move_threats(board, board.points[index])
+			if counts[0 if mark == Mark.X else 1] == self.n - 2:
+				fours.append(index)
+		return fours
+
+	def is_double(self, mark: Mark, index: int) -> bool:
+		"""
+		Checks if the move creates two tiles where the player wins.
+		:param mark: Mark of the player
+		:param index: Index of the empty tile
+		:return: True if the move makes double four
+		"""
+		return len(self.get_win_tiles(mark, self.board.points[index])) >= 2
+
+	def get_win_tiles(self, mark: Mark, position: Point) -> Set[int]:
+		"""
+		Finds empty tiles that would complete `end_count` marks of the player on lines
+		through the empty position if the player made a move there.
+		:param mark: Mark of the player
+		:param position: Point with empty tile
+		:return: Set of indexes of the tiles
+		"""
+		n = self.n
+		digit = 1 if mark == Mark.X else 2
+		tiles = set()
+		index = position.x*self.board.size + position.y
+		for d in range(4):
+			line = self.board.lines[index][d][0]
+			digits, center = self.evaluator.get_line_digits(self.board, index, d)
+			digits[center] = digit
+			for start in range(max(0, center - n + 1), min(center, len(digits) - n) + 1):
+				window = digits[start:start + n]
+				if window.count(digit) == n - 1 and window.count(0) == 1:
+					tiles.add(line[start + window.index(0)])
+		return tiles
+
+	def get_threat_counts(self, mark: Mark) -> Tuple[Dict[int, int], Dict[int, int]]:
+		"""
+		Computes for every candidate tile the most marks of each player in one window
+		through the tile without marks of the other player.
+		:param mark: Mark of the attacker
+		:return: Tuple of dictionaries from tile index to number of marks of the attacker and the defender
+		"""
+		a = 0 if mark == Mark.X else 1
+		attacker = {index: counts[a] for index, counts in self.counts.items()}
+		defender = {index: counts[1 - a] for index, counts in self.counts.items()}
+		return attacker, defender
+
+	def play(self, position: Point, mark: Mark) -> None:
+		"""
+		Makes the move and updates counts of marks of tiles on lines through it and of new candidate tiles.
+		:param position: Point with the move
+		:param mark: Mark of the player
+		"""
+		board = self.board
+		size = board.size
+		self.counts_stack.append(self.counts)
+		counts = self.counts.copy()
+		counts.pop(position.x*size + position.y, None)
+		board.set_move(position, mark)
+		for dx, dy in [[1,0], [1,1], [0,1], [1,-1]]:
+			for i in range(-self.n + 1, self.n):
+				x = position.x + i*dx
+				y = position.y + i*dy
+				if i != 0 and 0 <= x < size and 0 <= y < size and x*size + y in board.candidates:
+					counts[x*size + y] = self.evaluator.get_move_threats(board, board.points[x*size + y])
+		for index in board.candidates:
+			if index not in counts:
+				counts[index] = self.evaluator.get_move_threats(board, board.points[index])
+		self.counts = counts
+
+	def take_back(self) -> None:
+		"""
+		Takes back the last move made with play().
+		"""
+		self.board.undo_move()
+		self.counts = self.counts_stack.pop()
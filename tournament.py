@@ -0,0 +1,226 @@
+from game import Game
+from player import Player, RandomPlayer, MiniMaxPlayer, MCTSPlayer
+from records import GameRecord, GameRecordWriter
+from utils import Point, Mark
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import argparse
+import ast
+import time
+
+
+# Players that can play in tournament by their command line name
+PLAYER_TYPES = {
+	'random': RandomPlayer,
+	'minimax': MiniMaxPlayer,
+	'mcts': MCTSPlayer,
+}
+
+
+class GameResult:
+	"""
+	Result of one headless game.
+	"""
+	def __init__(self, winner: Optional[str], moves: int, move_times: Dict[str, List[float]], nodes: Dict[str, int], record: Optional[GameRecord] = None) -> None:
+		# 'a' or 'b' for the winning player, None for draw
+		self.winner = winner
+		self.moves = moves
+		# Seconds spent on every move by players 'a' and 'b'
+		self.move_times = move_times
+		# Number of nodes searched by players 'a' and 'b' (0 for players that do not search)
+		self.nodes = nodes
+		# Moves and result of the game
+		self.record = record
+
+
+class TournamentResult:
+	"""
+	Aggregated results of all games of the tournament from the perspective of player A.
+	"""
+	def __init__(self, player_a: str, player_b: str) -> None:
+		self.player_a = player_a
+		self.player_b = player_b
+		self.wins = 0
+		self.draws = 0
+		self.losses = 0
+		self.moves = 0
+		self.move_times = {'a': [], 'b': []}
+		self.nodes = {'a': 0, 'b': 0}
+		self.duration = 0.0
+
+	def add_game(self, result: GameResult) -> None:
+		"""
+		Adds result of one game.
+		:param result: GameResult of the game
+		"""
+		if result.winner == 'a':
+			self.wins += 1
+		elif result.winner == 'b':
+			self.losses += 1
+		else:
+			self.draws += 1
+		self.moves += result.moves
+		for key in ['a', 'b']:
+			self.move_times[key].extend(result.move_times[key])
+			self.nodes[key] += result.nodes[key]
+
+	def get_games(self) -> int:
+		return self.wins + self.draws + self.losses
+
+	def get_average_move_time(self, key: str) -> float:
+		"""
+		:param key: 'a' or 'b' for player A or B
+		:return: Average time of one move in seconds
+		"""
+		if len(self.move_times[key]) == 0:
+			return 0.0
+		return sum(self.move_times[key]) / len(self.move_times[key])
+
+	def __repr__(self):
+		games = self.get_games()
+		s = f'{self.player_a} vs {self.player_b}: {games} games\n'
+		if games == 0:
+			return s
+		s += f'A wins: {self.wins} ({100*self.wins/games:.1f}%), draws: {self.draws} ({100*self.draws/games:.1f}%), '
+		s += f'losses: {self.losses} ({100*self.losses/games:.1f}%)\n'
+		s += f'Average move time A: {1000*self.get_average_move_time("a"):.3f} ms, B: {1000*self.get_average_move_time("b"):.3f} ms\n'
+		for key in ['a', 'b']:
+			if self.nodes[key] > 0:
+				s += f'Nodes per second {key.upper()}: {self.nodes[key]/sum(self.move_times[key]):.0f}\n'
+		s += f'Average game length: {self.moves/games:.1f} moves\n'
+		if self.duration > 0:
+			s += f'Games per second: {games/self.duration:.2f}\n'
+		return s
+
+
+def create_player(name: str, options: dict, end_count: int, mark: Mark) -> Player:
+	"""
+	Creates player by its name in PLAYER_TYPES.
+	:param name: Name of the player type
+	:param options: Additional keyword arguments of the player's constructor
+	:param end_count: Number of marks in a row necessary for winning
+	:param mark: Mark of the player
+	:return: New Player
+	"""
+	return PLAYER_TYPES[name](end_count, mark, '', **options)
+
+
+def play_game(player_a: Tuple[str, dict], player_b: Tuple[str, dict], a_is_x: bool, board_size: int, end_count: int) -> GameResult:
+	"""
+	Plays one game without GUI. Players are created here so the function can run
+	in worker process.
+	:param player_a: Tuple of player A type name and its options
+	:param player_b: Tuple of player B type name and its options
+	:param a_is_x: True if player A plays X (moves first)
+	:param board_size: Size of the board
+	:param end_count: Number of marks in a row necessary for winning
+	:return: GameResult of the game
+	"""
+	mark_a, mark_b = (Mark.X, Mark.O) if a_is_x else (Mark.O, Mark.X)
+	a = create_player(player_a[0], player_a[1], end_count, mark_a)
+	b = create_player(player_b[0], player_b[1], end_count, mark_b)
+	keys = {mark_a: 'a', mark_b: 'b'}
+	move_times = {'a': [], 'b': []}
+	nodes = {'a': 0, 'b': 0}
+	results = []
+	last_time = [time.perf_counter()]
+
+	def on_move(position: Point, player: Player) -> None:
+		now = time.perf_counter()
+		move_times[keys[player.mark]].append(now - last_time[0])
+		last_time[0] = now
+		if player.last_stats is not None:
+			nodes[keys[player.mark]] += player.last_stats.nodes
+
+	def on_end(positions: List[Point], player: Player) -> None:
+		on_move(None, player)
+		results.append(keys[player.mark] if len(positions) > 0 else None)
+
+	# Worker processes of the players must be stopped or this process could not exit
+	try:
+		if a_is_x:
+			game = Game(a, b, end_count, board_size)
+		else:
+			game = Game(b, a, end_count, board_size)
+		game.bind_draw_mark_listener(on_move)
+		game.bind_end_game_listener(on_end)
+	finally:
+		a.close()
+		b.close()
+	names = [player_a[0], player_b[0]] if a_is_x else [player_b[0], player_a[0]]
+	winner = None if results[0] is None else (mark_a if results[0] == 'a' else mark_b)
+	record = GameRecord.from_moves(board_size, end_count, names[0], names[1], game.board.move_stack, winner)
+	return GameResult(results[0], len(game.board.move_stack), move_times, nodes, record)
+
+
+def _play_game(args: tuple) -> GameResult:
+	return play_game(*args)
+
+
+def run_tournament(player_a: Tuple[str, dict], player_b: Tuple[str, dict], games: int, board_size: int = 10, end_count: int = 4, workers: int = 1, record_path: Optional[str] = None) -> TournamentResult:
+	"""
+	Plays number of games between two players. Players switch X and O every game.
+	:param player_a: Tuple of player A type name and its options
+	:param player_b: Tuple of player B type name and its options
+	:param games: Number of games to play
+	:param board_size: Size of the board
+	:param end_count: Number of marks in a row necessary for winning
+	:param workers: Number of processes playing the games
+	:param record_path: Path to file where games are appended (see records.py), None to not record them
+	:return: TournamentResult with all games
+	"""
+	result = TournamentResult(player_a[0], player_b[0])
+	writer = GameRecordWriter(record_path) if record_path is not None else None
+	games_args = [(player_a, player_b, i % 2 == 0, board_size, end_count) for i in range(games)]
+	start = time.perf_counter()
+	if workers > 1:
+		with ProcessPoolExecutor(workers) as executor:
+			chunksize = max(1, games // (workers * 8))
+			for game_result in executor.map(_play_game, games_args, chunksize=chunksize):
+				result.add_game(game_result)
+				if writer is not None:
+					writer.write(game_result.record)
+	else:
+		for args in games_args:
+			game_result = play_game(*args)
+			result.add_game(game_result)
+			if writer is not None:
+				writer.write(game_result.record)
+	result.duration = time.perf_counter() - start
+	if writer is not None:
+		writer.close()
+	return result
+
+
+def parse_options(options: List[str]) -> dict:
+	"""
+	Parses player options from command line in form key=value.
+	:param options: List of strings with options
+	:return: Dictionary with options, values are parsed as Python literals when possible
+	"""
+	parsed = {}
+	for option in options:
+		key, value = option.split('=', 1)
+		try:
+			parsed[key] = ast.literal_eval(value)
+		except (ValueError, SyntaxError):
+			parsed[key] = value
+	return parsed
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Plays games between two AI players without GUI.')
+	parser.add_argument('player_a', choices=PLAYER_TYPES.keys())
+	parser.add_argument('player_b', choices=PLAYER_TYPES.keys())
+	parser.add_argument('--games', type=int, default=100)
+	parser.add_argument('--board-size', type=int, default=10)
+	parser.add_argument('--end-count', type=int, default=4)
+	parser.add_argument('--workers', type=int, default=1)
+	parser.add_argument('--a-option', action='append', default=[], help='Option of player A as key=value, e.g. max_depth=2')
+	parser.add_argument('--b-option', action='append', default=[], help='Option of player B as key=value')
+	parser.add_argument('--record', help='Path to file where games are appended')
+	args = parser.parse_args()
+
+	result = run_tournament((args.player_a, parse_options(args.a_option)), (args.player_b, parse_options(args.b_option)),
+							args.games, args.board_size, args.end_count, args.workers, args.record)
+	print(result, end='')
@@ -1,13 +1,29 @@
 from enum import Enum
+from typing import Dict, Tuple
 import math
 
+MAX_BOARD_SIZE = 32
+
+
 class Point:
 	"""
-	Represents simple 2D point.
+	Represents simple 2D point. Points are immutable and Points of tiles of boards up to
+	MAX_BOARD_SIZE are interned - there is only one such Point for every pair of coordinates,
+	so creating it allocates nothing and comparing it is mostly an identity check.
+	Other Points (e.g. pixels of the view) are not interned, so they cannot fill the memory.
 	"""
-	def __init__(self, x: int = 0, y: int = 0) -> None:
-		self.x = x
-		self.y = y
+	__slots__ = ['x', 'y']
+	_interned: Dict[Tuple[int, int], 'Point'] = {}
+
+	def __new__(cls, x: int = 0, y: int = 0) -> 'Point':
+		point = cls._interned.get((x, y))
+		if point is None:
+			point = object.__new__(cls)
+			object.__setattr__(point, 'x', x)
+			object.__setattr__(point, 'y', y)
+			if type(x) is int and type(y) is int and 0 <= x < MAX_BOARD_SIZE and 0 <= y < MAX_BOARD_SIZE:
+				point = cls._interned.setdefault((x, y), point)
+		return point
 
 	def distance_to(self, other: 'Point') -> float:
 		"""
@@ -18,11 +34,18 @@ class Point:
 		return math.sqrt((self.x - other.x)**2 + (self.y - other.y)**2)
 
 	def __eq__(self, other):
-		return self.x == other.x and self.y == other.y
+		return self is other or (isinstance(other, Point) and self.x == other.x and self.y == other.y)
 
 	def __hash__(self):
 		return hash((self.x, self.y))
 
+	def __setattr__(self, name, value):
+		raise AttributeError('Point is immutable')
+
+	def __reduce__(self):
+		# Unpickled and copied tile Points are interned too
+		return (Point, (self.x, self.y))
+
 	def __repr__(self):
 		return f'[{self.x}:{self.y}]'
 
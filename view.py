@@ -1,6 +1,7 @@
 from tkinter import Tk, Frame, Canvas, Event, Text
 from utils import Point, MouseState, Mark
 from typing import List, Callable, Optional
+from queue import Queue, Empty
 
 
 class View:
@@ -20,6 +21,9 @@ class View:
 		self.canvas = Canvas(self.frame, width=window_size, height=window_size+self.text_size, bd=0)
 		self.mouse_state = MouseHandler()
 		self.tile_click_listener = None
+		# Callbacks from other threads that are called from mainloop
+		self.callbacks = Queue()
+		self.callback_interval_ms = 20
 		self.text_area = Text(self.frame, bd=0)
 		self.text_area.place(x=self.text_margin, y=window_size, height=self.text_size , width=window_size - self.text_margin)
 		self.text_area.tag_configure('font', font=('Verdana', 30, 'bold'))
@@ -44,6 +48,7 @@ class View:
 		self.canvas.bind("<ButtonRelease-1>", self.on_left_mouse_release)
 
 		self.init_board()
+		self.root.after(self.callback_interval_ms, self.process_callbacks)
 
 	def init_board(self) -> None:
 		"""
@@ -90,6 +95,33 @@ class View:
 		
 		self.text_area.insert('0.1', mark_text, 'font')
 
+	def draw_info(self, text: str) -> None:
+		"""
+		Shows additional information (e.g. search statistics of AI player) in window title.
+		:param text: Text to show
+		"""
+		self.root.title(f'Gomoku - {text}')
+
+	def call_soon(self, callback: Callable) -> None:
+		"""
+		Schedules callback to be called from tkinter mainloop. Tkinter is not thread-safe
+		so this is the only method of View that can be called from other threads.
+		:param callback: Callable without parameters
+		"""
+		self.callbacks.put(callback)
+
+	def process_callbacks(self) -> None:
+		"""
+		Calls all scheduled callbacks and plans next check of the queue.
+		"""
+		while True:
+			try:
+				callback = self.callbacks.get_nowait()
+			except Empty:
+				break
+			callback()
+		self.root.after(self.callback_interval_ms, self.process_callbacks)
+
 	def bind_tile_click_listener(self, listener: Callable) -> None:
 		"""
 		Method binds lister of clicks on game board with event of clicking.